@@ -0,0 +1,119 @@
+"""Benchmark ingest write throughput: per-row ORM path vs bulk upsert.
+
+The per-row path is the one ingest used to take for every profile:
+SELECT on (platform_number, cycle_number), setattr or add on the ORM
+object, commit and refresh. The bulk path is upsert_profiles, one
+INSERT ... ON CONFLICT DO UPDATE per batch through Core. Both keep the
+climatology current. Each is timed on a fresh database for a first load
+(all inserts) and a reload of the same profiles (all updates). Run from
+the repository root:
+
+    python -m benchmarks.bench_ingest_upsert [--rows 5000] [--batch-size 200]
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from migrations import run_migrations
+from models import ArgoFloat, Base
+from utils import ingest
+from utils.climatology import apply_contributions, profile_contributions
+from utils.ingest import upsert_profiles
+from utils.profile_store import encode_profile
+
+LEVELS = 100
+
+
+def synthetic_profiles(rows: int):
+    """Parsed profiles shaped like parse_file output, 100 levels each"""
+    base = datetime(2020, 1, 1)
+    pres = np.linspace(5, 2000, LEVELS)
+    profiles = []
+    for i in range(rows):
+        temp = 28 * np.exp(-pres / 800) + 2 + random.gauss(0, 0.5)
+        psal = 34.5 + 0.5 * np.tanh(pres / 500) + random.gauss(0, 0.05)
+        profiles.append({
+            "platform_number": str(5900000 + i % 500),
+            "cycle_number": i // 500,
+            "file_name": f"R{i}.nc",
+            "date_created": base,
+            "juld": base + timedelta(hours=6 * i),
+            "latitude": random.uniform(-60, 30),
+            "longitude": random.uniform(20, 147),
+            "parameters": ["PRES", "TEMP", "PSAL"],
+            "data_mode": "R",
+            "profile_blob": encode_profile({
+                "PRES": {"values": pres, "units": "decibar", "long_name": "Sea water pressure"},
+                "TEMP": {"values": temp, "units": "degree_Celsius", "long_name": "Sea temperature"},
+                "PSAL": {"values": psal, "units": "psu", "long_name": "Practical salinity"}
+            }),
+            "profile_data": None
+        })
+    return profiles
+
+
+def per_row(db, profiles, batch_size):
+    for data in profiles:
+        argo_float = db.query(ArgoFloat).filter(
+            ArgoFloat.platform_number == data['platform_number'],
+            ArgoFloat.cycle_number == data['cycle_number']
+        ).first()
+        removed = profile_contributions([argo_float]) if argo_float else None
+        if argo_float:
+            for field, value in data.items():
+                setattr(argo_float, field, value)
+        else:
+            argo_float = ArgoFloat(**data)
+            db.add(argo_float)
+        argo_float.date_updated = datetime.now()
+        apply_contributions(db, added=profile_contributions([argo_float]), removed=removed)
+        db.commit()
+        db.refresh(argo_float)
+
+
+def bulk(db, profiles, batch_size):
+    upsert_profiles(db, profiles, batch_size)
+
+
+def time_path(write, profiles, batch_size):
+    """Seconds for a first load and a reload on a fresh database"""
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        Base.metadata.create_all(bind=engine)
+        run_migrations(engine)
+        db = sessionmaker(bind=engine)()
+        timings = []
+        for _ in range(2):
+            started = time.perf_counter()
+            write(db, profiles, batch_size)
+            timings.append(time.perf_counter() - started)
+        db.close()
+        engine.dispose()
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=5000, help="profiles to write")
+    parser.add_argument("--batch-size", type=int, default=ingest.INGEST_BATCH_SIZE,
+                        help="profiles per upsert statement")
+    args = parser.parse_args()
+
+    random.seed(0)
+    profiles = synthetic_profiles(args.rows)
+    print(f"{args.rows} profiles x {LEVELS} levels, batch size {args.batch_size}")
+    print(f"{'path':<10} {'insert rows/s':>14} {'update rows/s':>14}")
+    for name, write in (("per-row", per_row), ("upsert", bulk)):
+        inserted, updated = time_path(write, profiles, args.batch_size)
+        print(f"{name:<10} {args.rows / inserted:>14.0f} {args.rows / updated:>14.0f}")
+
+
+if __name__ == "__main__":
+    main()
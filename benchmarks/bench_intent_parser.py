@@ -0,0 +1,63 @@
+"""Micro-benchmark of the natural-language intent parser.
+
+Parses a corpus of representative dashboard questions and reports the
+mean and worst per-question latency. Run from the repository root:
+
+    python -m benchmarks.bench_intent_parser [--rounds 2000]
+"""
+import argparse
+import time
+
+from utils.intent_parser import parse_question
+
+SAMPLE_QUESTIONS = [
+    "Hello",
+    "hi there, what can you do?",
+    "Show temperature in Arabian Sea in 2024",
+    "What was the salinity at 100m depth?",
+    "Compare temperature between Arabian Sea and Bay of Bengal",
+    "compare salinity in the bay of bengal vs the arabian sea in 2025",
+    "What ARGO floats do you have data for?",
+    "Show me all floats from 2024",
+    "Show me data from float 5906221",
+    "display pressure profiles from January 2024 to March 2024",
+    "find salinity within the Indian Ocean at 500 meters in july 2025",
+    "get temperatures deeper than 1000 m in the arabian sea",
+    "list available floats",
+    "what is the thermal structure of the bay of bengal in october 2024",
+    "Show temp and salt between february 2024 and april 2024 at 2000 m",
+    "difference in pressure versus depth for indian ocean floats",
+    "how warm is the ocean today",
+    "Show float trajectories in the Arabian Sea during may 2024",
+    "what is the salinity difference between 2024 and 2025",
+    "help",
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=2000, help="passes over the corpus")
+    args = parser.parse_args()
+
+    # Warm up the compiled pattern and caches
+    for question in SAMPLE_QUESTIONS:
+        parse_question(question)
+
+    worst = 0.0
+    started = time.perf_counter()
+    for _ in range(args.rounds):
+        for question in SAMPLE_QUESTIONS:
+            t0 = time.perf_counter()
+            parse_question(question)
+            worst = max(worst, time.perf_counter() - t0)
+    elapsed = time.perf_counter() - started
+
+    parsed = args.rounds * len(SAMPLE_QUESTIONS)
+    print(f"questions parsed: {parsed}")
+    print(f"mean latency:     {elapsed / parsed * 1e6:.1f} us")
+    print(f"worst latency:    {worst * 1e6:.1f} us")
+    print(f"throughput:       {parsed / elapsed:,.0f} questions/s")
+
+
+if __name__ == "__main__":
+    main()
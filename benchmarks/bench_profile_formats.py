@@ -0,0 +1,73 @@
+"""Benchmark payload size and encode time of the profile response formats.
+
+Encodes one deep synthetic profile (PRES, TEMP, PSAL) the way
+/visualizations/float/{id}/profile serves it: the old float lists
+through the standard json module, JSON through orjson, Arrow IPC and
+MessagePack. Formats whose optional package is missing are skipped.
+Run from the repository root:
+
+    python -m benchmarks.bench_profile_formats [--levels 4000]
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from utils import profile_formats
+from utils.profile_formats import encode_arrow, encode_json, encode_msgpack
+from utils.profile_store import PROFILE_DTYPE, decode_profile, encode_profile, profile_to_json
+
+REPEATS = 50
+PLATFORM = "5906221"
+
+
+def deep_profile(levels: int):
+    pres = np.linspace(5, 2000, levels)
+    return decode_profile(encode_profile({
+        "PRES": {"values": pres, "units": "decibar", "long_name": "Sea water pressure"},
+        "TEMP": {"values": 28 * np.exp(-pres / 800) + 2, "units": "degree_Celsius",
+                 "long_name": "Sea temperature in-situ ITS-90 scale"},
+        "PSAL": {"values": 34.5 + 0.5 * np.tanh(pres / 500), "units": "psu",
+                 "long_name": "Practical salinity"}
+    }))
+
+
+def time_encode(encode) -> tuple:
+    best = float("inf")
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        content = encode()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000, len(content)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--levels", type=int, default=4000, help="levels per parameter")
+    args = parser.parse_args()
+
+    profile = deep_profile(args.levels)
+    arrays = {name: dict(p, values=np.ascontiguousarray(p['values'], dtype=PROFILE_DTYPE))
+              for name, p in profile.items()}
+    encoders = {
+        "json (stdlib lists)": lambda: json.dumps(
+            {"platform_number": PLATFORM, "profile_data": profile_to_json(profile)}
+        ).encode("utf-8"),
+    }
+    if profile_formats.orjson is not None:
+        encoders["json (orjson)"] = lambda: encode_json({"platform_number": PLATFORM, "profile_data": arrays})
+    if profile_formats.pyarrow is not None:
+        encoders["arrow ipc"] = lambda: encode_arrow(PLATFORM, profile)
+    if profile_formats.msgpack is not None:
+        encoders["msgpack"] = lambda: encode_msgpack(PLATFORM, profile)
+
+    print(f"{args.levels} levels x {len(profile)} parameters")
+    print(f"{'format':<22} {'bytes':>10} {'encode ms':>10}")
+    for name, encode in encoders.items():
+        elapsed, size = time_encode(encode)
+        print(f"{name:<22} {size:>10} {elapsed:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
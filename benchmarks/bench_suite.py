@@ -0,0 +1,280 @@
+"""End-to-end benchmark suite writing machine-readable results.
+
+Runs against a throwaway database and data directory built from the
+synthetic archive of benchmarks.synthetic_argo, through the real app:
+
+- parse: parse_netcdf on single-profile files, parse_netcdf_profiles on
+  multi-profile day files
+- ingest: /files/batch uploads, first as single-profile files (inserts)
+  and then as day files holding the same profiles (updates)
+- floats: GET /floats latency per filter, with the table grown to each
+  of --sizes rows
+- query: ArgoQueryProcessor.process_query latency at each size
+- profile: the profile endpoint in every format and with LOD options,
+  plus the NDJSON batch endpoint
+
+Results go to a JSON file keyed by metric name, with the git revision
+and settings, so runs of two versions can be diffed; --compare prints
+the change against an earlier results file. Run from the repository root:
+
+    python -m benchmarks.bench_suite [--sizes 10000,100000,1000000] [--output results.json]
+        [--compare previous.json]
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List
+
+from benchmarks.bench_intent_parser import SAMPLE_QUESTIONS
+from benchmarks.synthetic_argo import float_tracks, generate
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPEATS = 20
+FILL_BATCH = 10000
+FILTERS = {
+    "page": "/floats?limit=1000",
+    "fields": "/floats?limit=1000&fields=platform_number,juld,latitude,longitude",
+    "month": "/floats?year=2022&month=6",
+    "bbox": "/floats?bbox=60,5,75,20",
+    "region": "/floats?region=Bay of Bengal",
+    "polygon": "/floats?polygon=55 0,75 0,75 20,55 20"
+}
+
+
+class Results:
+    """Metrics collected by the suite, with their units"""
+
+    def __init__(self):
+        self.metrics: Dict[str, Dict[str, Any]] = {}
+
+    def add(self, name: str, value: float, unit: str):
+        self.metrics[name] = {"value": round(value, 4), "unit": unit}
+        print(f"  {name:<48} {value:>12.3f} {unit}")
+
+
+def timed(fn: Callable[[], Any], repeats: int = REPEATS) -> List[float]:
+    """Wall times of repeated calls in milliseconds, after one warm-up call"""
+    fn()
+    times = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - started) * 1000)
+    return times
+
+
+def p95(times: List[float]) -> float:
+    return sorted(times)[max(int(len(times) * 0.95) - 1, 0)]
+
+
+def bench_parse(results: Results, single: List[str], multi: List[str], levels: int):
+    from utils.netcdf_parser import parse_netcdf, parse_netcdf_profiles
+
+    started = time.perf_counter()
+    for path in single:
+        parse_netcdf(path)
+    elapsed = time.perf_counter() - started
+    results.add("parse.single.files_per_s", len(single) / elapsed, "1/s")
+    results.add("parse.single.levels_per_s", len(single) * levels / elapsed, "1/s")
+
+    started = time.perf_counter()
+    profiles = sum(len(parse_netcdf_profiles(path)) for path in multi)
+    results.add("parse.multi.profiles_per_s", profiles / (time.perf_counter() - started), "1/s")
+
+
+def upload(client, paths: List[str]) -> int:
+    """Upload files in one batch and return the number of profiles stored"""
+    handles = [open(path, "rb") for path in paths]
+    try:
+        response = client.post("/files/batch?wait=true",
+                                files=[("files", (os.path.basename(path), handle)) for path, handle in zip(paths, handles)])
+    finally:
+        for handle in handles:
+            handle.close()
+    response.raise_for_status()
+    report = response.json()["files"]
+    failed = [entry for entry in report if entry["status"] != "ok"]
+    if failed:
+        raise RuntimeError(f"Ingest failed: {failed[0]}")
+    return sum(entry.get("profiles", 1) for entry in report)
+
+
+def bench_ingest(results: Results, client, single: List[str], multi: List[str]):
+    started = time.perf_counter()
+    rows = upload(client, single)
+    results.add("ingest.single.rows_per_s", rows / (time.perf_counter() - started), "1/s")
+    started = time.perf_counter()
+    rows = upload(client, multi)
+    results.add("ingest.multi_update.rows_per_s", rows / (time.perf_counter() - started), "1/s")
+
+
+def fill(session, start_rows: int, target_rows: int, seed: int):
+    """Grow argo_floats to target_rows with metadata-only profiles spread over 2020-2024"""
+    from sqlalchemy import insert
+
+    from models import ArgoFloat
+
+    cycles = 100
+    platforms = (target_rows - start_rows + cycles - 1) // cycles
+    tracks = float_tracks(platforms, cycles, datetime(2020, 1, 1), 5 * 365, seed + start_rows)
+    now = datetime.now()
+    rows = []
+    for i, track in enumerate(tracks[:target_rows - start_rows]):
+        rows.append(dict(
+            track, platform_number=f"F{start_rows}-{i // cycles}", file_name=None,
+            date_created=now, date_updated=now, parameters=["PRES", "TEMP", "PSAL"]
+        ))
+        if len(rows) == FILL_BATCH:
+            session.execute(insert(ArgoFloat), rows)
+            rows = []
+    if rows:
+        session.execute(insert(ArgoFloat), rows)
+    session.commit()
+
+
+def bench_floats(results: Results, client, size: int):
+    for name, url in FILTERS.items():
+        times = timed(lambda: client.get(url).raise_for_status())
+        results.add(f"floats.{size}.{name}.median_ms", statistics.median(times), "ms")
+        results.add(f"floats.{size}.{name}.p95_ms", p95(times), "ms")
+
+
+def bench_query(results: Results, session, size: int):
+    from utils.query_processor import ArgoQueryProcessor
+
+    processor = ArgoQueryProcessor(session)
+    times = []
+    for question in SAMPLE_QUESTIONS:
+        times.extend(timed(lambda: processor.process_query(question), repeats=1))
+        session.expire_all()
+    results.add(f"query.{size}.mean_ms", statistics.mean(times), "ms")
+    results.add(f"query.{size}.max_ms", max(times), "ms")
+
+
+def bench_profiles(results: Results, client, ids: List[int]):
+    from utils import profile_formats
+
+    float_id = ids[0]
+    variants = {"json": "format=json", "json_max_points_100": "format=json&max_points=100",
+                "json_standard_levels": "format=json&levels=standard"}
+    if profile_formats.pyarrow is not None:
+        variants["arrow"] = "format=arrow"
+    if profile_formats.msgpack is not None:
+        variants["msgpack"] = "format=msgpack"
+    for name, query in variants.items():
+        url = f"/visualizations/float/{float_id}/profile?{query}"
+        size = len(client.get(url).content)
+        times = timed(lambda: client.get(url).raise_for_status())
+        results.add(f"profile.{name}.median_ms", statistics.median(times), "ms")
+        results.add(f"profile.{name}.bytes", size, "B")
+
+    batch = ",".join(str(i) for i in ids[:100])
+    times = timed(lambda: client.get(f"/visualizations/floats/profiles?ids={batch}").raise_for_status(), repeats=5)
+    results.add("profile.batch_100.median_ms", statistics.median(times), "ms")
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(previous_path: str, metrics: Dict[str, Dict[str, Any]]):
+    with open(previous_path) as f:
+        previous = json.load(f)
+    print(f"\nChange against {previous.get('revision') or previous_path}:")
+    for name, metric in metrics.items():
+        old = previous["metrics"].get(name)
+        if old and old["value"]:
+            change = (metric["value"] - old["value"]) / old["value"] * 100
+            print(f"  {name:<48} {old['value']:>12.3f} -> {metric['value']:>12.3f} {metric['unit']:<4} {change:+7.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="10000,100000,1000000",
+                        help="comma separated argo_floats sizes for the /floats and query benchmarks")
+    parser.add_argument("--platforms", type=int, default=20, help="floats in the synthetic archive")
+    parser.add_argument("--cycles", type=int, default=25, help="profiles per float")
+    parser.add_argument("--levels", type=int, default=1000, help="levels of a full-depth profile")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="results file, bench-<revision>.json by default")
+    parser.add_argument("--compare", default=None, help="earlier results file to compare against")
+    args = parser.parse_args()
+    sizes = sorted(int(size) for size in args.sizes.split(","))
+    revision = git_revision()
+    output = os.path.abspath(args.output or f"bench-{revision or 'local'}.json")
+    random.seed(args.seed)
+
+    results = Results()
+    with tempfile.TemporaryDirectory() as workspace:
+        # Point the app at the workspace before anything imports database.py
+        os.environ["OCEAN_DATABASE_URL"] = f"sqlite:///{os.path.join(workspace, 'bench.db')}"
+        os.environ["OCEAN_RENDER_CACHE_DIR"] = os.path.join(workspace, "render_cache")
+        os.chdir(workspace)
+
+        print("Generating synthetic archive")
+        start = datetime(2024, 1, 1)
+        single = generate(os.path.join(workspace, "single"), args.platforms, args.cycles, args.levels,
+                          start, 365, seed=args.seed)
+        multi = generate(os.path.join(workspace, "multi"), args.platforms, args.cycles, args.levels,
+                         start, 365, multi=True, seed=args.seed)
+
+        print("parse")
+        bench_parse(results, single, multi, args.levels)
+
+        from fastapi.testclient import TestClient
+
+        import main as app_main
+        from database import ReadSessionLocal, SessionLocal
+        from models import ArgoFloat
+
+        with TestClient(app_main.app) as client:
+            print("ingest")
+            bench_ingest(results, client, single, multi)
+            print("profile")
+            ids = [row["id"] for row in client.get("/floats?fields=id&limit=100").json()]
+            bench_profiles(results, client, ids)
+
+            session = SessionLocal()
+            count = session.query(ArgoFloat).count()
+            reader = ReadSessionLocal()
+            for size in sizes:
+                print(f"floats and query at {size} rows")
+                if size > count:
+                    fill(session, count, size, args.seed)
+                    count = size
+                bench_floats(results, client, size)
+                bench_query(results, reader, size)
+            reader.close()
+            session.close()
+
+    report = {
+        "suite": "ocean-bench",
+        "revision": revision,
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "machine": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "settings": vars(args),
+        "metrics": results.metrics
+    }
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+    if args.compare:
+        compare(args.compare, results.metrics)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Benchmark month filters on GET /floats as the argo_floats table grows.
+
+Compares the old extract('year'/'month') predicate with the indexed
+half-open juld range used now. The queried month matches the same rows
+at every size, so the range query should stay flat while extract()
+grows with the table. Run from the repository root:
+
+    python -m benchmarks.bench_time_filter [--sizes 10000,50000,100000,200000]
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, extract, insert
+from sqlalchemy.orm import sessionmaker
+
+from migrations import run_migrations
+from models import ArgoFloat, Base
+from utils.float_query import apply_time_range, month_range
+
+REPEATS = 20
+
+
+def fill(session, start_rows: int, target_rows: int):
+    """Append synthetic profiles, about 100 per day from 2020, until target_rows exist.
+
+    Like the real catalog, the table grows by adding later dates, so a
+    fixed month always matches the same number of rows.
+    """
+    base = datetime(2020, 1, 1)
+    rows = []
+    for i in range(start_rows, target_rows):
+        rows.append({
+            "platform_number": str(5900000 + i % 5000),
+            "cycle_number": i // 5000,
+            "file_name": f"R{i}.nc",
+            "date_created": base,
+            "date_updated": base,
+            "juld": base + timedelta(seconds=864 * i + random.randrange(864)),
+            "latitude": random.uniform(-60, 30),
+            "longitude": random.uniform(20, 147),
+            "parameters": ["PRES", "TEMP", "PSAL"],
+            "data_mode": "R"
+        })
+        if len(rows) == 10000:
+            session.execute(insert(ArgoFloat), rows)
+            rows = []
+    if rows:
+        session.execute(insert(ArgoFloat), rows)
+    session.commit()
+
+
+def time_query(session, build) -> float:
+    best = float("inf")
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        build(session.query(ArgoFloat.id)).all()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def extract_filter(query):
+    return query.filter(extract('year', ArgoFloat.juld) == 2020,
+                        extract('month', ArgoFloat.juld) == 1)
+
+
+def range_filter(query):
+    return apply_time_range(query, *month_range(2020, 1))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="10000,50000,100000,200000",
+                        help="comma separated table sizes to measure")
+    args = parser.parse_args()
+    sizes = sorted(int(size) for size in args.sizes.split(","))
+
+    random.seed(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        Base.metadata.create_all(bind=engine)
+        run_migrations(engine)
+        session = sessionmaker(bind=engine)()
+
+        print(f"{'rows':>10} {'extract() ms':>14} {'juld range ms':>14}")
+        rows = 0
+        for size in sizes:
+            fill(session, rows, size)
+            rows = size
+            print(f"{rows:>10} {time_query(session, extract_filter):>14.2f} "
+                  f"{time_query(session, range_filter):>14.2f}")
+        session.close()
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""Synthetic ARGO profile files for benchmarks and local testing.
+
+Floats start at random positions in the Indian Ocean and drift a little
+every cycle, surfacing at even intervals over the date span. Each profile
+has a mixed layer, a thermocline and a halocline on pressure levels that
+are dense near the surface, and some profiles stop short of the full
+depth, leaving fill values like real casts. Files follow the Argo
+profile format: one R<platform>_<cycle>.nc per profile, or with --multi
+one <YYYYMMDD>_prof.nc per day holding every profile of that day, under
+<out>/<year>/<month>/ as in the data catalog. Run from the repository root:
+
+    python -m benchmarks.synthetic_argo OUT [--platforms 10] [--cycles 36] [--levels 500]
+        [--start 2024-01-01] [--days 365] [--multi] [--seed 0]
+"""
+import argparse
+import os
+import random
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List
+
+import netCDF4 as nc
+import numpy as np
+
+REFERENCE_DATE = datetime(1950, 1, 1)
+FILL_VALUE = 99999.0
+PARAMETERS = {
+    "PRES": ("decibar", "Sea water pressure, equals 0 at sea-level"),
+    "TEMP": ("degree_Celsius", "Sea temperature in-situ ITS-90 scale"),
+    "PSAL": ("psu", "Practical salinity")
+}
+# Box the floats are deployed in, (min_lat, max_lat, min_lon, max_lon)
+DEPLOYMENT_AREA = (-30.0, 22.0, 45.0, 100.0)
+MAX_PRESSURE = 2000.0
+
+
+def float_tracks(platforms: int, cycles: int, start: datetime, days: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """Metadata of every profile, ordered by platform then cycle"""
+    rng = random.Random(seed)
+    interval = timedelta(days=days) / max(cycles, 1)
+    min_lat, max_lat, min_lon, max_lon = DEPLOYMENT_AREA
+    profiles = []
+    for p in range(platforms):
+        lat, lon = rng.uniform(min_lat, max_lat), rng.uniform(min_lon, max_lon)
+        deployed = start + timedelta(hours=rng.uniform(0, 24 * interval.days))
+        for cycle in range(1, cycles + 1):
+            profiles.append({
+                "platform_number": str(5900000 + p),
+                "cycle_number": cycle,
+                "juld": deployed + (cycle - 1) * interval,
+                "latitude": round(lat, 4),
+                "longitude": round(lon, 4),
+                "data_mode": "D" if cycle < cycles * 0.6 else "R"
+            })
+            lat = min(max(lat + rng.gauss(0, 0.3), min_lat), max_lat)
+            lon = min(max(lon + rng.gauss(0, 0.3), min_lon), max_lon)
+    return profiles
+
+
+def profile_arrays(rng: np.random.Generator, levels: int, latitude: float) -> Dict[str, np.ndarray]:
+    """PRES/TEMP/PSAL of one cast; about one in five ends above MAX_PRESSURE"""
+    depth = levels if rng.random() > 0.2 else int(levels * rng.uniform(0.5, 0.95))
+    pres = 5 + (MAX_PRESSURE - 5) * np.linspace(0, 1, levels)[:depth] ** 1.5
+    surface = 29.5 - 0.3 * abs(latitude - 8) + rng.normal(0, 0.5)
+    mixed_layer = rng.uniform(20, 80)
+    thermocline = 0.5 * (1 - np.tanh((pres - mixed_layer - 100) / 120))
+    temp = 2.0 + (surface - 2.0) * (0.15 + 0.85 * thermocline) * np.exp(-pres / 1500)
+    psal = 34.7 + rng.uniform(-0.8, 1.4) * np.exp(-pres / 250) + 0.1 * thermocline
+    return {
+        "PRES": pres.astype(np.float32),
+        "TEMP": (temp + rng.normal(0, 0.02, depth)).astype(np.float32),
+        "PSAL": (psal + rng.normal(0, 0.005, depth)).astype(np.float32)
+    }
+
+
+def _char_variable(data, name, dims, values, width):
+    variable = data.createVariable(name, "S1", dims)
+    variable[:] = np.array([list(value.ljust(width)[:width]) for value in values], "S1").reshape(variable.shape)
+
+
+def write_profile_file(path: str, profiles: List[Dict[str, Any]]):
+    """Write profiles (metadata plus PRES/TEMP/PSAL arrays) as one Argo profile file"""
+    n_prof = len(profiles)
+    n_levels = max(len(p["PRES"]) for p in profiles)
+    with nc.Dataset(path, "w") as data:
+        data.title = "Argo float vertical profile"
+        data.institution = "Synthetic"
+        data.Conventions = "Argo-3.1 CF-1.6"
+        data.featureType = "trajectoryProfile"
+        for name, size in (("DATE_TIME", 14), ("STRING8", 8), ("STRING16", 16), ("N_PROF", n_prof),
+                           ("N_PARAM", len(PARAMETERS)), ("N_LEVELS", n_levels)):
+            data.createDimension(name, size)
+
+        _char_variable(data, "DATA_TYPE", ("STRING16",), ["Argo profile"], 16)
+        _char_variable(data, "REFERENCE_DATE_TIME", ("DATE_TIME",), [REFERENCE_DATE.strftime("%Y%m%d%H%M%S")], 14)
+        _char_variable(data, "DATE_CREATION", ("DATE_TIME",), [datetime.now().strftime("%Y%m%d%H%M%S")], 14)
+        _char_variable(data, "PLATFORM_NUMBER", ("N_PROF", "STRING8"), [p["platform_number"] for p in profiles], 8)
+        _char_variable(data, "DATA_MODE", ("N_PROF",), [p["data_mode"] for p in profiles], 1)
+        _char_variable(data, "STATION_PARAMETERS", ("N_PROF", "N_PARAM", "STRING16"),
+                       [name for _ in profiles for name in PARAMETERS], 16)
+
+        cycle = data.createVariable("CYCLE_NUMBER", "i4", ("N_PROF",), fill_value=99999)
+        cycle.long_name = "Float cycle number"
+        cycle[:] = [p["cycle_number"] for p in profiles]
+        juld = data.createVariable("JULD", "f8", ("N_PROF",), fill_value=999999.0)
+        juld.units = "days since 1950-01-01 00:00:00 UTC"
+        juld[:] = [(p["juld"] - REFERENCE_DATE).total_seconds() / 86400 for p in profiles]
+        for name, units in (("LATITUDE", "degree_north"), ("LONGITUDE", "degree_east")):
+            variable = data.createVariable(name, "f8", ("N_PROF",), fill_value=99999.0)
+            variable.units = units
+            variable[:] = [p[name.lower()] for p in profiles]
+
+        for name, (units, long_name) in PARAMETERS.items():
+            variable = data.createVariable(name, "f4", ("N_PROF", "N_LEVELS"), fill_value=FILL_VALUE)
+            variable.units = units
+            variable.long_name = long_name
+            values = np.full((n_prof, n_levels), FILL_VALUE, dtype=np.float32)
+            for i, profile in enumerate(profiles):
+                values[i, :len(profile[name])] = profile[name]
+            variable[:] = values
+
+
+def generate(out_dir: str, platforms: int = 10, cycles: int = 36, levels: int = 500,
+             start: datetime = datetime(2024, 1, 1), days: int = 365, multi: bool = False,
+             seed: int = 0) -> List[str]:
+    """Write a synthetic archive and return the paths of its files"""
+    rng = np.random.default_rng(seed)
+    profiles = [
+        dict(meta, **profile_arrays(rng, levels, meta["latitude"]))
+        for meta in float_tracks(platforms, cycles, start, days, seed)
+    ]
+    files = defaultdict(list)
+    for profile in profiles:
+        day = profile["juld"]
+        name = f"{day:%Y%m%d}_prof.nc" if multi else f"R{profile['platform_number']}_{profile['cycle_number']:03d}.nc"
+        files[os.path.join(out_dir, f"{day:%Y}", f"{day:%m}", name)].append(profile)
+
+    for path, contents in files.items():
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write_profile_file(path, contents)
+    return list(files)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("out", help="directory to write the files to")
+    parser.add_argument("--platforms", type=int, default=10, help="number of floats")
+    parser.add_argument("--cycles", type=int, default=36, help="profiles per float")
+    parser.add_argument("--levels", type=int, default=500, help="pressure levels of a full-depth profile")
+    parser.add_argument("--start", type=datetime.fromisoformat, default=datetime(2024, 1, 1),
+                        help="date of the first profiles (YYYY-MM-DD)")
+    parser.add_argument("--days", type=int, default=365, help="days spanned by the cycles of each float")
+    parser.add_argument("--multi", action="store_true", help="write one multi-profile file per day")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    paths = generate(args.out, args.platforms, args.cycles, args.levels, args.start, args.days,
+                     args.multi, args.seed)
+    print(f"Wrote {args.platforms * args.cycles} profiles in {len(paths)} files to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,54 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException, Depends, Request
-from fastapi.responses import HTMLResponse
+from fastapi import FastAPI, File, UploadFile, HTTPException, Depends, Query, Request, Response
+from fastapi.responses import HTMLResponse, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncSession
 import os
 import shutil
 from datetime import datetime
 
-from database import SessionLocal, engine, get_db
+from database import SessionLocal, async_engine, engine, get_async_db
 from models import Base, ArgoFloat, UserQuery
+from migrations import run_migrations
 from schemas import FloatResponse, QueryRequest, QueryResponse
 from utils.netcdf_parser import parse_netcdf
-from typing import List
-from routes.files import router as files_router
+from typing import Any, Dict, List
+from routes.files import router as files_router, enqueue_uploads, job_accepted
 from routes.queries import router as queries_router
 from routes.visualization import router as visualization_router
+from routes.trajectory import router as trajectory_router
+from routes.map import router as map_router
+from utils.ingest import shutdown_ingest
+from utils.metrics import CONTENT_TYPE, MetricsMiddleware, render_metrics
+from utils.float_query import (
+    DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, apply_time_range, fetch_page, float_columns_select,
+    float_summary_options, parse_fields, time_range
+)
+from utils.spatial import (
+    REGIONS, bbox_condition, parse_bbox, parse_polygon, polygon_condition, region_condition
+)
 
-# Create database tables
+# Create database tables and upgrade existing ones
 Base.metadata.create_all(bind=engine)
+run_migrations(engine)
 
 app = FastAPI(debug=True)
+
+@app.on_event("shutdown")
+def shutdown_workers():
+    shutdown_ingest()
+
+@app.on_event("shutdown")
+async def close_async_engine():
+    await async_engine.dispose()
+
+@app.exception_handler(PoolTimeoutError)
+async def database_busy(request: Request, exc: PoolTimeoutError):
+    # The writer connection stayed busy for OCEAN_WRITER_TIMEOUT seconds
+    return JSONResponse(status_code=503, content={"detail": "Database is busy, try again shortly"},
+                        headers={"Retry-After": "1"})
+
 @app.get("/", response_class=HTMLResponse)
 async def root():
     with open("ocean.html", "r", encoding="utf-8") as f:
@@ -32,7 +62,10 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
+# Outermost, so request timings include the CORS handling
+app.add_middleware(MetricsMiddleware)
 
 
 
@@ -43,65 +76,58 @@ os.makedirs(DATA_DIR, exist_ok=True)
 app.include_router(files_router)
 app.include_router(queries_router)
 app.include_router(visualization_router)
+app.include_router(trajectory_router)
+app.include_router(map_router)
+
+@app.get("/metrics")
+def get_metrics():
+    """Request, in-flight, payload size and stage metrics in Prometheus text format"""
+    return Response(content=render_metrics(), media_type=CONTENT_TYPE)
+
+@app.post("/upload-file/", status_code=202)
+async def upload_file(file: UploadFile = File(...)):
+    """Upload a NetCDF file and queue it for processing"""
+    job = await enqueue_uploads([file])
+    return job_accepted(job)
+
+
+
+@app.get("/floats", response_model=List[Dict[str, Any]])
+async def get_floats(response: Response, year: int = None, month: int = None,
+                     start: datetime = None, end: datetime = None,
+                     bbox: str = None, polygon: str = None, region: str = None,
+                     cursor: int = None, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                     fields: str = None, db: AsyncSession = Depends(get_async_db)):
+    """Get a page of ARGO floats, optionally filtered by year/month or a
+    [start, end) juld range and by bbox ("min_lon,min_lat,max_lon,max_lat"),
+    polygon ("lon lat,lon lat,...") or a named region.
 
-@app.post("/upload-file/")
-async def upload_file(file: UploadFile = File(...), db: Session = Depends(get_db)):
-    """Upload and process a NetCDF file"""
+    Pages are ordered by id; pass the X-Next-Cursor header of one page as
+    cursor= to get the next. fields= limits the returned columns."""
     try:
-        # Save file
-        file_path = os.path.join(DATA_DIR, file.filename)
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        
-        # Parse NetCDF
-        parsed_data = parse_netcdf(file_path)
-        
-        # Check if float already exists
-        existing_float = db.query(ArgoFloat).filter(
-            ArgoFloat.platform_number == parsed_data['platform_number'],
-            ArgoFloat.cycle_number == parsed_data['cycle_number']
-        ).first()
-        
-        if existing_float:
-            # Update existing record
-            for key, value in parsed_data.items():
-                setattr(existing_float, key, value)
-            existing_float.date_updated = datetime.now()
-        else:
-            # Create new record
-            new_float = ArgoFloat(
-                **parsed_data,
-                file_name=file.filename,
-                date_created=datetime.now(),
-                date_updated=datetime.now()
-            )
-            db.add(new_float)
-        
-        db.commit()
-        
-        return {"message": f"File {file.filename} processed successfully"}
-    
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error processing file: {str(e)}")
-
-
-
-@app.get("/floats", response_model=List[FloatResponse])
-def get_floats(year: int = None, month: int = None, db: Session = Depends(get_db)):
-    """Get list of ARGO floats, optionally filtered by year and month"""
-    query = db.query(ArgoFloat)
-    if year and month:
-        from sqlalchemy import extract
-        query = query.filter(ArgoFloat.juld != None)
-        query = query.filter(extract('year', ArgoFloat.juld) == year)
-        query = query.filter(extract('month', ArgoFloat.juld) == month)
-    floats = query.all()
+        query = float_columns_select(parse_fields(fields))
+        query = apply_time_range(query, *time_range(year, month, start, end))
+        if bbox:
+            query = query.filter(bbox_condition(db, parse_bbox(bbox)))
+        if polygon:
+            query = query.filter(polygon_condition(db, parse_polygon(polygon)))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if region:
+        if region not in REGIONS:
+            raise HTTPException(status_code=400, detail=f"Unknown region, expected one of: {', '.join(REGIONS)}")
+        query = query.filter(region_condition(db, region))
+    floats, next_cursor = await fetch_page(db, query, cursor, limit)
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = str(next_cursor)
     return floats
 
 @app.get("/floats/{float_id}", response_model=FloatResponse)
-def get_float(float_id: int, db: Session = Depends(get_db)):
+async def get_float(float_id: int, db: AsyncSession = Depends(get_async_db)):
     """Get details for a specific float"""
-    argo_float = db.query(ArgoFloat).filter(ArgoFloat.id == float_id).first()
+    argo_float = (await db.execute(
+        select(ArgoFloat).options(float_summary_options()).filter(ArgoFloat.id == float_id)
+    )).scalars().first()
     if not argo_float:
         raise HTTPException(status_code=404, detail="Float not found")
     return argo_float
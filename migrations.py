@@ -0,0 +1,183 @@
+"""Schema upgrades for existing databases.
+
+Base.metadata.create_all() only creates missing tables, so columns and
+indexes added after a database was first created are applied here. Every
+step is idempotent and safe to run on each startup.
+"""
+from sqlalchemy import func, inspect, null, select, text
+from sqlalchemy.orm import Session
+
+from models import ArgoFloat, ClimatologyCell
+from utils.climatology import apply_contributions, profile_contributions, rebuild_climatology
+from utils.profile_lod import profile_tiers
+from utils.profile_store import encode_profile, load_profile
+from utils.spatial import RTREE_TABLE
+from utils.summary import REBUILD_SUMMARY_SQL, SUMMARY_TRIGGERS
+
+PROFILE_CONVERT_BATCH_SIZE = 500
+
+
+def run_migrations(engine):
+    """Bring an existing database up to the current schema"""
+    add_profile_blob_column(engine)
+    convert_legacy_profiles(engine)
+    create_spatial_index(engine)
+    create_profile_indexes(engine)
+    create_summary_triggers(engine)
+    build_climatology(engine)
+
+
+def _columns(engine, table_name):
+    return {column['name'] for column in inspect(engine).get_columns(table_name)}
+
+
+def add_profile_blob_column(engine):
+    """Add argo_floats.profile_blob to databases created before it existed"""
+    if 'profile_blob' in _columns(engine, ArgoFloat.__tablename__):
+        return
+    with engine.begin() as conn:
+        conn.execute(text("ALTER TABLE argo_floats ADD COLUMN profile_blob BLOB"))
+
+
+def convert_legacy_profiles(engine):
+    """Re-encode JSON profile lists as binary blobs, with their LOD tiers, and drop the JSON copy"""
+    table = ArgoFloat.__table__
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(
+                table.select()
+                .with_only_columns(table.c.id, table.c.profile_blob, table.c.profile_data)
+                .where(table.c.profile_blob.is_(None), table.c.profile_data.isnot(None))
+                .limit(PROFILE_CONVERT_BATCH_SIZE)
+            ).all()
+            if not rows:
+                return
+            for row in rows:
+                profile = load_profile(row)
+                conn.execute(
+                    table.update()
+                    .where(table.c.id == row.id)
+                    .values(profile_blob=encode_profile(profile, profile_tiers(profile)), profile_data=null())
+                )
+
+
+def create_spatial_index(engine):
+    """Create the SQLite R*Tree over float positions and its sync triggers"""
+    if engine.dialect.name != "sqlite":
+        return
+    if RTREE_TABLE in inspect(engine).get_table_names():
+        return
+    insert_new = f"""
+        INSERT INTO {RTREE_TABLE} (id, min_lon, max_lon, min_lat, max_lat)
+        SELECT NEW.id, NEW.longitude, NEW.longitude, NEW.latitude, NEW.latitude
+        WHERE NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL;
+    """
+    with engine.begin() as conn:
+        conn.execute(text(
+            f"CREATE VIRTUAL TABLE {RTREE_TABLE} USING rtree(id, min_lon, max_lon, min_lat, max_lat)"
+        ))
+        conn.execute(text(f"""
+            CREATE TRIGGER argo_floats_rtree_insert AFTER INSERT ON argo_floats
+            BEGIN {insert_new} END
+        """))
+        conn.execute(text(f"""
+            CREATE TRIGGER argo_floats_rtree_update AFTER UPDATE OF latitude, longitude ON argo_floats
+            BEGIN
+                DELETE FROM {RTREE_TABLE} WHERE id = OLD.id;
+                {insert_new}
+            END
+        """))
+        conn.execute(text(f"""
+            CREATE TRIGGER argo_floats_rtree_delete AFTER DELETE ON argo_floats
+            BEGIN
+                DELETE FROM {RTREE_TABLE} WHERE id = OLD.id;
+            END
+        """))
+        conn.execute(text(f"""
+            INSERT INTO {RTREE_TABLE} (id, min_lon, max_lon, min_lat, max_lat)
+            SELECT id, longitude, longitude, latitude, latitude FROM argo_floats
+            WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+        """))
+
+
+def create_profile_indexes(engine):
+    """Add the juld index and the unique (platform_number, cycle_number) index.
+
+    Older databases may hold duplicate profiles for the same platform and
+    cycle; before the unique index is created only the most recently
+    updated row of each is kept, and the removed keys are printed.
+    """
+    table = ArgoFloat.__table__
+    existing = {index['name'] for index in inspect(engine).get_indexes(table.name)}
+    missing = [index for index in table.indexes if index.name not in existing]
+    if not missing:
+        return
+    if any(index.unique for index in missing):
+        with Session(engine) as db:
+            remove_duplicate_profiles(db)
+    with engine.begin() as conn:
+        for index in missing:
+            index.create(conn)
+
+
+def remove_duplicate_profiles(db):
+    """Delete all but the newest row of every (platform_number, cycle_number)"""
+    ranked = select(
+        ArgoFloat.id,
+        func.row_number().over(
+            partition_by=(ArgoFloat.platform_number, ArgoFloat.cycle_number),
+            order_by=(ArgoFloat.date_updated.desc().nulls_last(), ArgoFloat.id.desc())
+        ).label("position")
+    ).where(ArgoFloat.cycle_number.isnot(None)).subquery()
+    duplicates = db.query(ArgoFloat).filter(
+        ArgoFloat.id.in_(select(ranked.c.id).where(ranked.c.position > 1))
+    ).all()
+    if not duplicates:
+        return
+    keys = sorted({(f.platform_number, f.cycle_number) for f in duplicates})
+    print(f"Removing {len(duplicates)} duplicate profiles of {len(keys)} platform/cycle keys before "
+          f"creating the unique index: {', '.join(f'{platform}/{cycle}' for platform, cycle in keys)}")
+    # Cubes built from these rows would otherwise keep counting them
+    if db.query(ClimatologyCell).first() is not None:
+        apply_contributions(db, removed=profile_contributions(duplicates))
+    for duplicate in duplicates:
+        db.delete(duplicate)
+    db.commit()
+
+
+def _normalize_sql(sql):
+    return " ".join(sql.split())
+
+
+def create_summary_triggers(engine):
+    """Install the float_summary triggers and rebuild the table.
+
+    Runs whenever an installed trigger is missing or differs from
+    SUMMARY_TRIGGERS, so fixes to the trigger SQL also rebuild the table.
+    The rebuild goes first and the triggers are created last, in one
+    transaction, so a failed rebuild leaves nothing behind that would skip
+    it on the next startup.
+    """
+    if engine.dialect.name != "sqlite":
+        return
+    with engine.begin() as conn:
+        existing = dict(conn.execute(text("SELECT name, sql FROM sqlite_master WHERE type = 'trigger'")).all())
+        if all(_normalize_sql(existing.get(name) or "") == _normalize_sql(ddl)
+               for name, ddl in SUMMARY_TRIGGERS.items()):
+            return
+        for name in SUMMARY_TRIGGERS:
+            conn.execute(text(f"DROP TRIGGER IF EXISTS {name}"))
+        conn.execute(text("DELETE FROM float_summary"))
+        conn.execute(text(REBUILD_SUMMARY_SQL))
+        for ddl in SUMMARY_TRIGGERS.values():
+            conn.execute(text(ddl))
+
+
+def build_climatology(engine):
+    """Fill the climatology cubes of databases that predate them"""
+    with Session(engine) as db:
+        if db.query(ClimatologyCell).first() is not None:
+            return
+        if db.query(ArgoFloat.id).filter(ArgoFloat.profile_blob.isnot(None)).first() is None:
+            return
+        rebuild_climatology(db)
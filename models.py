@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, JSON
+from sqlalchemy import Column, Integer, String, Float, DateTime, JSON, LargeBinary, Index
 from sqlalchemy import ForeignKey
 from sqlalchemy.ext.declarative import declarative_base
 from geoalchemy2 import Geometry
@@ -7,6 +7,13 @@ Base = declarative_base()
 
 class ArgoFloat(Base):
     __tablename__ = "argo_floats"
+    __table_args__ = (
+        # One row per profile; also serves the upsert lookup during ingest
+        Index('ux_argo_floats_platform_cycle', 'platform_number', 'cycle_number', unique=True),
+        # Covers trajectory lookups without touching the table rows
+        Index('ix_argo_floats_platform_juld', 'platform_number', 'juld', 'latitude', 'longitude',
+              'cycle_number'),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     platform_number = Column(String, index=True)
@@ -15,12 +22,72 @@ class ArgoFloat(Base):
     date_updated = Column(DateTime)
     latitude = Column(Float)
     longitude = Column(Float)
-    juld = Column(DateTime)  # Julian day timestamp
+    juld = Column(DateTime, index=True)  # Julian day timestamp
     # location = Column(Geometry('POINT'))
     parameters = Column(JSON)  # Available parameters
     cycle_number = Column(Integer)
     data_mode = Column(String)
-    profile_data = Column(JSON)  # Store processed profile data
+    profile_data = Column(JSON(none_as_null=True))  # Legacy JSON profile lists, superseded by profile_blob
+    profile_blob = Column(LargeBinary)  # float32 profile arrays, see utils/profile_store.py
+    
+class FloatSummary(Base):
+    """Profile counts per month and parameter, kept current by triggers"""
+    __tablename__ = "float_summary"
+    
+    year = Column(Integer, primary_key=True)  # 0 when juld is unknown
+    month = Column(Integer, primary_key=True)  # 0 when juld is unknown
+    parameter = Column(String, primary_key=True)  # '' counts all profiles
+    float_count = Column(Integer, nullable=False, default=0)
+    
+class DataFile(Base):
+    """Catalog entry for a NetCDF file under the raw data/<year>/<month> tree"""
+    __tablename__ = "data_files"
+    __table_args__ = (
+        Index('ux_data_files_root_path', 'root', 'path', unique=True),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    root = Column(String, nullable=False)  # Absolute data directory
+    path = Column(String, nullable=False)  # Relative to root
+    size = Column(Integer)
+    mtime = Column(Float)
+    content_hash = Column(String)  # sha256 of the file contents
+    platform_number = Column(String)
+    cycle_number = Column(Integer)
+    juld = Column(DateTime, index=True)
+    latitude = Column(Float)
+    longitude = Column(Float)
+    parameters = Column(JSON)
+    error = Column(String)  # Parse error, if the file could not be read
+    scanned_at = Column(DateTime)
+    
+class DataFileProfile(Base):
+    """Header of one profile of a cataloged file; multi-profile files have N_PROF of them"""
+    __tablename__ = "data_file_profiles"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    file_id = Column(Integer, ForeignKey("data_files.id"), nullable=False, index=True)
+    platform_number = Column(String)
+    cycle_number = Column(Integer)
+    juld = Column(DateTime, index=True)
+    latitude = Column(Float)
+    longitude = Column(Float)
+    
+class ClimatologyCell(Base):
+    """Mergeable moments of one parameter per grid cell, standard level and month"""
+    __tablename__ = "climatology_cells"
+    
+    year = Column(Integer, primary_key=True)
+    month = Column(Integer, primary_key=True)
+    lat_cell = Column(Integer, primary_key=True)  # floor(latitude / cell size)
+    lon_cell = Column(Integer, primary_key=True)  # floor(longitude / cell size)
+    level = Column(Integer, primary_key=True)  # Standard pressure level in dbar
+    parameter = Column(String, primary_key=True)
+    count = Column(Integer, nullable=False)
+    mean = Column(Float, nullable=False)
+    m2 = Column(Float, nullable=False)  # Sum of squared deviations from the mean
+    min_value = Column(Float)
+    max_value = Column(Float)
     
 class UserQuery(Base):
     __tablename__ = "user_queries"
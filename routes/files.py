@@ -1,72 +1,107 @@
-from fastapi import APIRouter, Depends, File, UploadFile, HTTPException
+from fastapi import APIRouter, Depends, File, UploadFile, HTTPException, Query, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
+import asyncio
 import os
-import shutil
-from datetime import datetime
-from typing import List
+from typing import Any, Dict, List
 
-from database import get_db
+from database import get_async_db, get_db, get_read_db
 from models import ArgoFloat
 from schemas import FloatResponse
-from utils.netcdf_parser import parse_netcdf
+from utils.float_query import (
+    DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, fetch_page, float_columns_select, float_summary_options, parse_fields
+)
+from utils.climatology import apply_contributions, profile_contributions
+from utils.map_render import render_cache
+from utils.response_cache import bump_data_version
+from utils.file_catalog import catalog_years, reconcile_catalog
+from utils.ingest import DATA_DIR, IngestJob, IngestQueueFull, discard_staged, ingest_queue, stage_uploads
 
 router = APIRouter(prefix="/files", tags=["files"])
 
-@router.post("/upload", response_model=dict)
-async def upload_file(file: UploadFile = File(...), db: Session = Depends(get_db)):
-    """Upload and process a NetCDF file"""
+async def enqueue_uploads(files: List[UploadFile]) -> IngestJob:
+    """Stage uploaded files and hand them to the ingest queue"""
+    # Reject before touching the disk when the pipeline is saturated
+    if ingest_queue.full():
+        raise HTTPException(status_code=503, detail="Ingest queue is full, retry later",
+                            headers={"Retry-After": "5"})
+    paths, report = await stage_uploads(files)
     try:
-        # Ensure data directory exists
-        DATA_DIR = "data"
-        os.makedirs(DATA_DIR, exist_ok=True)
-        
-        # Save file
-        file_path = os.path.join(DATA_DIR, file.filename)
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        
-        # Parse NetCDF
-        parsed_data = parse_netcdf(file_path)
-        
-        # Check if float already exists
-        existing_float = db.query(ArgoFloat).filter(
-            ArgoFloat.platform_number == parsed_data['platform_number'],
-            ArgoFloat.cycle_number == parsed_data['cycle_number']
-        ).first()
-        
-        if existing_float:
-            # Update existing record
-            for key, value in parsed_data.items():
-                setattr(existing_float, key, value)
-            existing_float.date_updated = datetime.now()
-            db.commit()
-            db.refresh(existing_float)
-            return {"message": f"Float {existing_float.platform_number} updated successfully"}
-        else:
-            # Create new record
-            new_float = ArgoFloat(
-                **parsed_data,
-                file_name=file.filename,
-                date_created=datetime.now(),
-                date_updated=datetime.now()
-            )
-            db.add(new_float)
-            db.commit()
-            db.refresh(new_float)
-            return {"message": f"Float {new_float.platform_number} added successfully"}
-    
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error processing file: {str(e)}")
+        return ingest_queue.submit(paths, report)
+    except IngestQueueFull as e:
+        discard_staged(paths)
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+
+def job_accepted(job: IngestJob) -> dict:
+    return {
+        "message": "File accepted for processing",
+        "job_id": job.id,
+        "status_url": f"/files/jobs/{job.id}"
+    }
+
+@router.post("/upload", response_model=dict, status_code=202)
+async def upload_file(file: UploadFile = File(...)):
+    """Upload a NetCDF file and queue it for processing"""
+    job = await enqueue_uploads([file])
+    return job_accepted(job)
+
+@router.post("/batch", response_model=dict)
+async def upload_batch(files: List[UploadFile] = File(...), wait: bool = True):
+    """Upload many NetCDF files (or zip/tar archives of them) in one request.
+
+    By default the call waits for the job and returns the per-file report;
+    pass wait=false to get the job id back immediately instead.
+    """
+    job = await enqueue_uploads(files)
+    if not wait:
+        return job_accepted(job)
 
-@router.get("/", response_model=List[FloatResponse])
-def get_all_floats(db: Session = Depends(get_db)):
-    """Get all ARGO floats"""
-    return db.query(ArgoFloat).all()
+    await asyncio.wrap_future(job.future)
+    report = job.to_dict()
+    succeeded = sum(1 for r in job.report if r["status"] == "ok")
+    report["message"] = f"Processed {succeeded} of {len(job.report)} files successfully"
+    return report
+
+@router.get("/jobs/{job_id}", response_model=dict)
+def get_job(job_id: str):
+    """Get the progress of an ingest job"""
+    job = ingest_queue.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+@router.post("/catalog/reconcile", response_model=dict)
+def reconcile_data_catalog(db: Session = Depends(get_db)):
+    """Sync the raw data/<year>/<month> file catalog with the directory"""
+    stats = reconcile_catalog(db, DATA_DIR)
+    return {"message": "Catalog reconciled", **stats, "years": catalog_years(db, DATA_DIR)}
+
+@router.get("/catalog/years", response_model=List[int])
+def get_catalog_years(db: Session = Depends(get_read_db)):
+    """Years present in the raw data catalog"""
+    return catalog_years(db, DATA_DIR)
+
+@router.get("/", response_model=List[Dict[str, Any]])
+async def get_all_floats(response: Response, cursor: int = None,
+                         limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                         fields: str = None, db: AsyncSession = Depends(get_async_db)):
+    """Get a page of ARGO floats; follow X-Next-Cursor with cursor= for more"""
+    try:
+        query = float_columns_select(parse_fields(fields))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    floats, next_cursor = await fetch_page(db, query, cursor, limit)
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = str(next_cursor)
+    return floats
 
 @router.get("/{float_id}", response_model=FloatResponse)
-def get_float(float_id: int, db: Session = Depends(get_db)):
+async def get_float(float_id: int, db: AsyncSession = Depends(get_async_db)):
     """Get a specific float by ID"""
-    argo_float = db.query(ArgoFloat).filter(ArgoFloat.id == float_id).first()
+    argo_float = (await db.execute(
+        select(ArgoFloat).options(float_summary_options()).filter(ArgoFloat.id == float_id)
+    )).scalars().first()
     if not argo_float:
         raise HTTPException(status_code=404, detail="Float not found")
     return argo_float
@@ -78,9 +113,12 @@ def delete_float(float_id: int, db: Session = Depends(get_db)):
     if not argo_float:
         raise HTTPException(status_code=404, detail="Float not found")
     
-    # Delete the file
+    # Delete the file, unless other profiles of a multi-profile file still use it
+    shared = argo_float.file_name and db.query(ArgoFloat.id).filter(
+        ArgoFloat.file_name == argo_float.file_name, ArgoFloat.id != argo_float.id
+    ).first() is not None
     try:
-        if argo_float.file_name:
+        if argo_float.file_name and not shared:
             file_path = os.path.join("data", argo_float.file_name)
             if os.path.exists(file_path):
                 os.remove(file_path)
@@ -89,7 +127,12 @@ def delete_float(float_id: int, db: Session = Depends(get_db)):
         print(f"Error deleting file: {str(e)}")
     
     # Delete from database
+    juld = argo_float.juld
+    apply_contributions(db, removed=profile_contributions([argo_float]))
     db.delete(argo_float)
     db.commit()
+    bump_data_version()
+    if juld:
+        render_cache.invalidate_date(juld.strftime('%Y-%m-%d'))
     
     return {"message": f"Float {argo_float.platform_number} deleted successfully"}
\ No newline at end of file
@@ -0,0 +1,41 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from datetime import datetime
+
+from database import get_read_db
+from models import ArgoFloat
+from utils.clustering import DEFAULT_ZOOM, clustered_map_data
+from utils.float_query import apply_time_range, time_range
+from utils.map_utils import float_markers
+from utils.spatial import REGIONS, bbox_condition, parse_bbox, region_condition
+
+router = APIRouter(prefix="/map", tags=["map"])
+
+@router.get("/clusters")
+def get_clusters(zoom: int = Query(DEFAULT_ZOOM, ge=0, le=22), bbox: str = None,
+                 year: int = None, month: int = None, start: datetime = None, end: datetime = None,
+                 region: str = None, db: Session = Depends(get_read_db)):
+    """Get float positions clustered for a map zoom level and viewport
+    ("min_lon,min_lat,max_lon,max_lat"); lone positions and high zoom
+    levels come back as individual markers"""
+    query = db.query(ArgoFloat.id, ArgoFloat.latitude, ArgoFloat.longitude).filter(
+        ArgoFloat.latitude.isnot(None), ArgoFloat.longitude.isnot(None)
+    )
+    try:
+        query = apply_time_range(query, *time_range(year, month, start, end))
+        if bbox:
+            query = query.filter(bbox_condition(db, parse_bbox(bbox)))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if region:
+        if region not in REGIONS:
+            raise HTTPException(status_code=400, detail=f"Unknown region, expected one of: {', '.join(REGIONS)}")
+        query = query.filter(region_condition(db, region))
+
+    rows = query.all()
+    map_data = clustered_map_data(
+        [row.latitude for row in rows], [row.longitude for row in rows],
+        lambda indices: float_markers(db, [rows[i].id for i in indices]),
+        zoom
+    )
+    return map_data or {"center": None, "zoom": zoom, "clusters": [], "markers": []}
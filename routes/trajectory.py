@@ -0,0 +1,56 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from datetime import datetime
+
+from database import get_read_db
+from models import ArgoFloat
+from utils.float_query import time_range
+from utils.spatial import bbox_condition, parse_bbox
+from utils.trajectory import build_trajectory, platform_positions, window_positions
+
+router = APIRouter(tags=["trajectories"])
+
+@router.get("/floats/{float_id}/trajectory")
+def get_float_trajectory(float_id: int, start: datetime = None, end: datetime = None,
+                         tolerance: float = Query(0.0, ge=0), db: Session = Depends(get_read_db)):
+    """Get the trajectory of the platform that recorded a float profile"""
+    platform_number = db.query(ArgoFloat.platform_number).filter(ArgoFloat.id == float_id).scalar()
+    if platform_number is None:
+        raise HTTPException(status_code=404, detail="Float not found")
+    return _platform_trajectory(db, platform_number, start, end, tolerance)
+
+@router.get("/trajectories/{platform_number}")
+def get_platform_trajectory(platform_number: str, start: datetime = None, end: datetime = None,
+                            tolerance: float = Query(0.0, ge=0), db: Session = Depends(get_read_db)):
+    """Get the time-ordered positions of a platform, optionally simplified
+    with a Douglas-Peucker tolerance in degrees"""
+    return _platform_trajectory(db, platform_number, start, end, tolerance)
+
+@router.get("/trajectories")
+def get_trajectories(start: datetime, end: datetime, bbox: str = None,
+                     tolerance: float = Query(0.0, ge=0), db: Session = Depends(get_read_db)):
+    """Get the trajectories of all platforms within a [start, end) window"""
+    try:
+        start, end = time_range(start=start, end=end)
+        condition = bbox_condition(db, parse_bbox(bbox)) if bbox else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    positions = window_positions(db, start, end, condition)
+    return {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "trajectories": [
+            build_trajectory(platform_number, rows, tolerance)
+            for platform_number, rows in positions.items()
+        ]
+    }
+
+def _platform_trajectory(db, platform_number, start, end, tolerance):
+    try:
+        start, end = time_range(start=start, end=end)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    rows = platform_positions(db, platform_number, start, end)
+    if not rows:
+        raise HTTPException(status_code=404, detail="No positions found for this platform")
+    return build_trajectory(platform_number, rows, tolerance)
@@ -1,80 +1,171 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import load_only
+from datetime import datetime
 import json
 
-from database import get_db
+from database import get_async_db
 from models import ArgoFloat
+from utils.float_query import apply_time_range, time_range
+from utils.metrics import note, stage
+from utils.profile_formats import encode_json, json_profile, negotiate_format, profile_response
+from utils.profile_lod import apply_lod
+from utils.profile_store import load_profile, profile_to_json
+from utils.spatial import REGIONS, bbox_condition, parse_bbox, region_condition
 
 router = APIRouter(prefix="/visualizations", tags=["visualizations"])
 
+MAX_BATCH_FLOATS = 1000
+
 @router.get("/float/{float_id}/profile")
-def get_float_profile(float_id: int, db: Session = Depends(get_db)):
-    """Get profile data for visualization"""
-    argo_float = db.query(ArgoFloat).filter(ArgoFloat.id == float_id).first()
-    if not argo_float:
-        raise HTTPException(status_code=404, detail="Float not found")
-    
-    if not argo_float.profile_data:
-        raise HTTPException(status_code=404, detail="No profile data available")
-    
-    return {
-        "platform_number": argo_float.platform_number,
-        "profile_data": argo_float.profile_data
-    }
+async def get_float_profile(float_id: int, request: Request, format: str = None,
+                            max_points: int = Query(None, ge=2), levels: str = None,
+                            db: AsyncSession = Depends(get_async_db)):
+    """Get profile data for visualization as JSON, Arrow IPC or MessagePack
+    (chosen by the Accept header or format=json|arrow|msgpack).
+
+    max_points= thins the profile to at most that many levels, preserving
+    its shape; levels= interpolates it onto "standard" or given pressures."""
+    fmt = negotiate_format(request, format)
+    argo_float = await _get_float(db, float_id)
+    return await run_in_threadpool(_serve_profile, argo_float, fmt, max_points, levels,
+                                   "No profile data available")
 
 @router.get("/float/{float_id}/temperature")
-def get_temperature_profile(float_id: int, db: Session = Depends(get_db)):
+async def get_temperature_profile(float_id: int, request: Request, format: str = None,
+                                  max_points: int = Query(None, ge=2), levels: str = None,
+                                  db: AsyncSession = Depends(get_async_db)):
     """Get temperature profile data"""
-    argo_float = db.query(ArgoFloat).filter(ArgoFloat.id == float_id).first()
-    if not argo_float:
-        raise HTTPException(status_code=404, detail="Float not found")
-    
-    if not argo_float.profile_data or 'TEMP' not in argo_float.profile_data:
-        raise HTTPException(status_code=404, detail="No temperature data available")
-    
-    return {
-        "platform_number": argo_float.platform_number,
-        "temperature_data": argo_float.profile_data['TEMP']
-    }
+    fmt = negotiate_format(request, format)
+    argo_float = await _get_float(db, float_id)
+    return await run_in_threadpool(_serve_profile, argo_float, fmt, max_points, levels,
+                                   "No temperature data available", "temperature_data", 'TEMP')
 
 @router.get("/float/{float_id}/salinity")
-def get_salinity_profile(float_id: int, db: Session = Depends(get_db)):
+async def get_salinity_profile(float_id: int, request: Request, format: str = None,
+                               max_points: int = Query(None, ge=2), levels: str = None,
+                               db: AsyncSession = Depends(get_async_db)):
     """Get salinity profile data"""
-    argo_float = db.query(ArgoFloat).filter(ArgoFloat.id == float_id).first()
+    fmt = negotiate_format(request, format)
+    argo_float = await _get_float(db, float_id)
+    return await run_in_threadpool(_serve_profile, argo_float, fmt, max_points, levels,
+                                   "No salinity data available", "salinity_data", 'PSAL')
+
+async def _get_float(db: AsyncSession, float_id: int) -> ArgoFloat:
+    argo_float = (await db.execute(select(ArgoFloat).filter(ArgoFloat.id == float_id))).scalars().first()
     if not argo_float:
         raise HTTPException(status_code=404, detail="Float not found")
-    
-    if not argo_float.profile_data or 'PSAL' not in argo_float.profile_data:
-        raise HTTPException(status_code=404, detail="No salinity data available")
-    
-    return {
-        "platform_number": argo_float.platform_number,
-        "salinity_data": argo_float.profile_data['PSAL']
-    }
+    return argo_float
+
+def _serve_profile(argo_float, fmt, max_points, levels, missing, field="profile_data", param=None):
+    """Decode, reduce and encode a loaded float's profile.
+
+    CPU-bound (LTTB runs in Python), so the async routes call it through
+    run_in_threadpool to keep it off the event loop."""
+    profile = load_profile(argo_float)
+    if not profile or (param is not None and param not in profile):
+        raise HTTPException(status_code=404, detail=missing)
+    try:
+        profile = apply_lod(argo_float, profile, max_points, levels)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return profile_response(fmt, argo_float.platform_number, profile, field, param)
+
+@router.get("/floats/profiles")
+async def get_float_profiles(ids: str = None, parameters: str = None,
+                             year: int = None, month: int = None, start: datetime = None, end: datetime = None,
+                             bbox: str = None, region: str = None,
+                             limit: int = Query(100, ge=1, le=MAX_BATCH_FLOATS),
+                             max_points: int = Query(None, ge=2), levels: str = None,
+                             db: AsyncSession = Depends(get_async_db)):
+    """Get the profiles of many floats as newline-delimited JSON, one float
+    per line. Floats are chosen by ids= ("1,2,3") or by the year/month,
+    start/end, bbox and region filters; parameters= ("TEMP,PSAL") limits
+    the returned parameters, PRES being always included."""
+    query = select(ArgoFloat).options(load_only(
+        ArgoFloat.id, ArgoFloat.platform_number, ArgoFloat.cycle_number, ArgoFloat.juld,
+        ArgoFloat.latitude, ArgoFloat.longitude, ArgoFloat.profile_blob, ArgoFloat.profile_data
+    ))
+    try:
+        if ids:
+            float_ids = list(dict.fromkeys(int(i) for i in ids.split(",")))
+            if len(float_ids) > MAX_BATCH_FLOATS:
+                raise ValueError(f"At most {MAX_BATCH_FLOATS} ids per request")
+            query = query.filter(ArgoFloat.id.in_(float_ids))
+        else:
+            float_ids = None
+            query = apply_time_range(query, *time_range(year, month, start, end))
+            if bbox:
+                query = query.filter(bbox_condition(db, parse_bbox(bbox)))
+            if region:
+                if region not in REGIONS:
+                    raise ValueError(f"Unknown region, expected one of: {', '.join(REGIONS)}")
+                query = query.filter(region_condition(db, region))
+            query = query.order_by(ArgoFloat.id).limit(limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    wanted = set(parameters.split(",")) | {'PRES'} if parameters else None
+
+    # One IN query for the whole batch; the session is gone once the
+    # response starts streaming, so rows are loaded up front
+    with stage("db_query"):
+        floats = {f.id: f for f in (await db.execute(query)).scalars()}
+    note(rows=len(floats))
+    order = float_ids if float_ids is not None else list(floats)
+
+    def lines():
+        for float_id in order:
+            argo_float = floats.get(float_id)
+            if argo_float is None:
+                yield encode_json({"id": float_id, "error": "Float not found"}) + b"\n"
+                continue
+            profile = load_profile(argo_float)
+            if wanted is not None:
+                profile = {name: param for name, param in profile.items() if name in wanted}
+            try:
+                profile = apply_lod(argo_float, profile, max_points, levels) if profile else profile
+            except ValueError as e:
+                yield encode_json({"id": float_id, "error": str(e)}) + b"\n"
+                continue
+            yield encode_json({
+                "id": argo_float.id,
+                "platform_number": argo_float.platform_number,
+                "cycle_number": argo_float.cycle_number,
+                "date": argo_float.juld.isoformat() if argo_float.juld else None,
+                "position": {"latitude": argo_float.latitude, "longitude": argo_float.longitude},
+                "profile_data": json_profile(profile)
+            }) + b"\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
 
 @router.get("/comparison/{float_ids}")
-def compare_floats(float_ids: str, db: Session = Depends(get_db)):
+async def compare_floats(float_ids: str, db: AsyncSession = Depends(get_async_db)):
     """Compare multiple floats"""
     try:
         ids = [int(id) for id in float_ids.split(",")]
-        floats = db.query(ArgoFloat).filter(ArgoFloat.id.in_(ids)).all()
+        floats = (await db.execute(select(ArgoFloat).filter(ArgoFloat.id.in_(ids)))).scalars().all()
         
         if len(floats) != len(ids):
             raise HTTPException(status_code=404, detail="One or more floats not found")
         
-        comparison_data = {}
-        for argo_float in floats:
-            comparison_data[argo_float.platform_number] = {
-                "profile_data": argo_float.profile_data,
-                "position": {
-                    "latitude": argo_float.latitude,
-                    "longitude": argo_float.longitude
-                },
-                "date": argo_float.juld.isoformat() if argo_float.juld else None,
-                "cycle_number": argo_float.cycle_number
-            }
-        
-        return comparison_data
+        return await run_in_threadpool(_comparison_data, floats)
     
     except ValueError:
-        raise HTTPException(status_code=400, detail="Invalid float IDs format")
\ No newline at end of file
+        raise HTTPException(status_code=400, detail="Invalid float IDs format")
+
+def _comparison_data(floats):
+    comparison_data = {}
+    for argo_float in floats:
+        comparison_data[argo_float.platform_number] = {
+            "profile_data": profile_to_json(load_profile(argo_float)),
+            "position": {
+                "latitude": argo_float.latitude,
+                "longitude": argo_float.longitude
+            },
+            "date": argo_float.juld.isoformat() if argo_float.juld else None,
+            "cycle_number": argo_float.cycle_number
+        }
+    return comparison_data
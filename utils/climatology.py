@@ -0,0 +1,227 @@
+"""Gridded climatology cubes maintained incrementally at ingest.
+
+Every profile is interpolated onto STANDARD_LEVELS and binned by
+CELL_SIZE-degree lat/lon cell, standard level and month. Each bin stores
+count, mean and M2 (sum of squared deviations), which merge exactly
+(Chan et al.) so adding, replacing or removing a profile is an O(levels)
+update. Regional statistics are then merges over a few hundred cells
+instead of scans over raw profiles. min/max cannot be un-merged; after a
+profile is removed they are bounds until rebuild_climatology() runs.
+"""
+import os
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import shapely
+from shapely.geometry import Polygon
+from sqlalchemy import bindparam, case, delete, update
+
+from database import dialect_insert
+from models import ArgoFloat, ClimatologyCell
+from utils.profile_math import interpolate_levels, pad_profiles, sorted_profile
+from utils.profile_store import load_profile
+from utils.spatial import REGIONS
+
+CELL_SIZE = float(os.getenv("OCEAN_CLIMATOLOGY_CELL_SIZE", "1.0"))
+STANDARD_LEVELS = [5, 10, 20, 30, 50, 75, 100, 150, 200, 300, 400, 500, 700, 1000, 1500, 2000]
+CLIMATOLOGY_PARAMETERS = ['TEMP', 'PSAL']
+CLIMATOLOGY_TABLE = ClimatologyCell.__table__
+REBUILD_BATCH_SIZE = 500
+
+# (year, month, lat_cell, lon_cell, level, parameter)
+CellKey = Tuple[int, int, int, int, int, str]
+# (count, mean, m2, min, max)
+Moments = Tuple[int, float, float, float, float]
+
+
+def nearest_level(depth: Optional[float]) -> int:
+    """Standard level closest to a depth in dbar; the shallowest when depth is None"""
+    if depth is None:
+        return STANDARD_LEVELS[0]
+    return min(STANDARD_LEVELS, key=lambda level: abs(level - depth))
+
+
+def profile_contributions(profiles: Iterable) -> Dict[CellKey, Moments]:
+    """Aggregate moments of a batch of profiles.
+
+    profiles yields objects with juld, latitude, longitude and the profile
+    columns read by load_profile (ArgoFloat rows or equivalents).
+    """
+    profiles = [
+        p for p in profiles
+        if p.juld is not None and p.latitude is not None and p.longitude is not None
+    ]
+    contributions = {}
+    if not profiles:
+        return contributions
+
+    loaded = [load_profile(p) for p in profiles]
+    years = np.array([p.juld.year for p in profiles])
+    months = np.array([p.juld.month for p in profiles])
+    lat_cells = np.floor(np.array([p.latitude for p in profiles]) / CELL_SIZE).astype(int)
+    lon_cells = np.floor(np.array([p.longitude for p in profiles]) / CELL_SIZE).astype(int)
+    levels = np.array(STANDARD_LEVELS)
+
+    for param in CLIMATOLOGY_PARAMETERS:
+        stacked = []
+        for profile in loaded:
+            if 'PRES' in profile and param in profile:
+                stacked.append(sorted_profile(profile['PRES']['values'], profile[param]['values']))
+            else:
+                stacked.append((np.empty(0), np.empty(0)))
+        values = interpolate_levels(*pad_profiles(stacked), levels)  # (profiles, levels)
+        rows, cols = np.nonzero(~np.isnan(values))
+        if rows.size == 0:
+            continue
+        samples = values[rows, cols]
+        keys = np.column_stack([years[rows], months[rows], lat_cells[rows], lon_cells[rows], levels[cols]])
+        unique, inverse = np.unique(keys, axis=0, return_inverse=True)
+        inverse = inverse.ravel()
+        counts = np.bincount(inverse)
+        sums = np.bincount(inverse, weights=samples)
+        squares = np.bincount(inverse, weights=samples * samples)
+        mins = np.full(len(unique), np.inf)
+        maxs = np.full(len(unique), -np.inf)
+        np.minimum.at(mins, inverse, samples)
+        np.maximum.at(maxs, inverse, samples)
+        means = sums / counts
+        m2s = np.maximum(squares - sums * means, 0.0)
+        for i, key in enumerate(unique.tolist()):
+            contributions[(*key, param)] = (int(counts[i]), float(means[i]), float(m2s[i]),
+                                            float(mins[i]), float(maxs[i]))
+    return contributions
+
+
+def merge_moments(a: Moments, b: Moments) -> Moments:
+    n_a, mean_a, m2_a, min_a, max_a = a
+    n_b, mean_b, m2_b, min_b, max_b = b
+    n = n_a + n_b
+    delta = mean_b - mean_a
+    return (n, mean_a + delta * n_b / n, m2_a + m2_b + delta * delta * n_a * n_b / n,
+            min(min_a, min_b), max(max_a, max_b))
+
+
+def _params(contributions: Dict[CellKey, Moments]) -> List[Dict]:
+    return [
+        {"k_year": year, "k_month": month, "k_lat": lat_cell, "k_lon": lon_cell, "k_level": level,
+         "k_param": parameter, "b_count": count, "b_mean": mean, "b_m2": m2, "b_min": min_value, "b_max": max_value}
+        for (year, month, lat_cell, lon_cell, level, parameter), (count, mean, m2, min_value, max_value)
+        in contributions.items()
+    ]
+
+
+def apply_contributions(db, added: Dict[CellKey, Moments] = None, removed: Dict[CellKey, Moments] = None):
+    """Remove then merge contributions into the stored cubes.
+
+    Both directions run as one executemany statement each, applying the
+    moment formulas in SQL, so no cell is loaded into the session.
+    Replacing a profile passes its old contribution as removed and its new
+    one as added.
+    """
+    table = CLIMATOLOGY_TABLE
+    if removed:
+        count, mean, m2 = table.c.count, table.c.mean, table.c.m2
+        n_b, mean_b, m2_b = bindparam("b_count"), bindparam("b_mean"), bindparam("b_m2")
+        n_a = count - n_b
+        # Inverse of merge_moments; cells left empty are deleted below
+        mean_a = (count * mean - n_b * mean_b) / case((n_a > 0, n_a * 1.0), else_=None)
+        delta = mean_b - mean_a
+        m2_a = m2 - m2_b - delta * delta * n_a * n_b * 1.0 / count
+        db.connection().execute(
+            update(table).where(*_key_clause()).values(
+                count=n_a,
+                mean=case((n_a > 0, mean_a), else_=0.0),
+                m2=case((n_a <= 0, 0.0), (m2_a < 0, 0.0), else_=m2_a)
+            ),
+            _params(removed)
+        )
+        db.connection().execute(delete(table).where(table.c.count <= 0))
+    if added:
+        stmt = dialect_insert(db, CLIMATOLOGY_TABLE).values(
+            year=bindparam("k_year"), month=bindparam("k_month"), lat_cell=bindparam("k_lat"),
+            lon_cell=bindparam("k_lon"), level=bindparam("k_level"), parameter=bindparam("k_param"),
+            count=bindparam("b_count"), mean=bindparam("b_mean"), m2=bindparam("b_m2"),
+            min_value=bindparam("b_min"), max_value=bindparam("b_max")
+        )
+        new = stmt.excluded
+        n = table.c.count + new.count
+        delta = new.mean - table.c.mean
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(table.primary_key.columns),
+            set_={
+                "count": n,
+                "mean": table.c.mean + delta * new.count / n,
+                "m2": table.c.m2 + new.m2 + delta * delta * table.c.count * new.count * 1.0 / n,
+                "min_value": case((new.min_value < table.c.min_value, new.min_value), else_=table.c.min_value),
+                "max_value": case((new.max_value > table.c.max_value, new.max_value), else_=table.c.max_value)
+            }
+        )
+        db.connection().execute(stmt, _params(added))
+
+
+def _key_clause():
+    table = CLIMATOLOGY_TABLE
+    return (
+        table.c.year == bindparam("k_year"), table.c.month == bindparam("k_month"),
+        table.c.lat_cell == bindparam("k_lat"), table.c.lon_cell == bindparam("k_lon"),
+        table.c.level == bindparam("k_level"), table.c.parameter == bindparam("k_param")
+    )
+
+
+def rebuild_climatology(db):
+    """Recompute every cube from the stored profiles"""
+    db.query(ClimatologyCell).delete()
+    last_id = 0
+    while True:
+        batch = db.query(ArgoFloat).filter(ArgoFloat.id > last_id).order_by(ArgoFloat.id).limit(REBUILD_BATCH_SIZE).all()
+        if not batch:
+            break
+        apply_contributions(db, profile_contributions(batch))
+        db.flush()
+        last_id = batch[-1].id
+        db.expunge_all()
+    db.commit()
+
+
+def _cells_in_polygon(cells: List[ClimatologyCell], vertices) -> List[ClimatologyCell]:
+    if not cells:
+        return []
+    centers_lat = (np.array([c.lat_cell for c in cells]) + 0.5) * CELL_SIZE
+    centers_lon = (np.array([c.lon_cell for c in cells]) + 0.5) * CELL_SIZE
+    inside = shapely.contains_xy(Polygon(vertices), centers_lon, centers_lat)
+    return [cell for cell, keep in zip(cells, inside) if keep]
+
+
+def regional_stats(db, region: str, parameter: str, level: int,
+                   year: Optional[int] = None, month: Optional[int] = None) -> Optional[Dict[str, float]]:
+    """Merged statistics of a parameter at a standard level over a named region"""
+    vertices = REGIONS[region]
+    lons = [lon for lon, _ in vertices]
+    lats = [lat for _, lat in vertices]
+    query = db.query(ClimatologyCell).filter(
+        ClimatologyCell.parameter == parameter,
+        ClimatologyCell.level == level,
+        ClimatologyCell.lat_cell >= int(np.floor(min(lats) / CELL_SIZE)),
+        ClimatologyCell.lat_cell <= int(np.floor(max(lats) / CELL_SIZE)),
+        ClimatologyCell.lon_cell >= int(np.floor(min(lons) / CELL_SIZE)),
+        ClimatologyCell.lon_cell <= int(np.floor(max(lons) / CELL_SIZE))
+    )
+    if year:
+        query = query.filter(ClimatologyCell.year == year)
+    if month:
+        query = query.filter(ClimatologyCell.month == month)
+
+    total = None
+    for cell in _cells_in_polygon(query.all(), vertices):
+        moments = (cell.count, cell.mean, cell.m2, cell.min_value, cell.max_value)
+        total = moments if total is None else merge_moments(total, moments)
+    if total is None:
+        return None
+    count, mean, m2, min_value, max_value = total
+    return {
+        "count": count,
+        "mean": mean,
+        "std": float(np.sqrt(m2 / (count - 1))) if count > 1 else 0.0,
+        "min": min_value,
+        "max": max_value
+    }
@@ -0,0 +1,101 @@
+"""Server-side grid clustering of float positions for map responses.
+
+Positions are bucketed into square cells sized to CLUSTER_PIXELS screen
+pixels at the requested Web Mercator zoom level. Cells holding more than
+one position become a cluster (count, centroid, bounds); lone positions
+and everything at or past CLUSTER_MAX_ZOOM are returned as individual
+markers, so payloads scale with the viewport rather than the archive.
+"""
+import os
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+CLUSTER_PIXELS = int(os.getenv("OCEAN_CLUSTER_PIXELS", "60"))
+CLUSTER_MAX_ZOOM = int(os.getenv("OCEAN_CLUSTER_MAX_ZOOM", "10"))
+DEFAULT_ZOOM = 4
+TILE_SIZE = 256
+
+
+def cell_size(zoom: int) -> float:
+    """Width in degrees of longitude of a cluster cell at a zoom level"""
+    return 360.0 / (TILE_SIZE * 2 ** zoom) * CLUSTER_PIXELS
+
+
+def cluster_points(lats: Sequence[float], lons: Sequence[float],
+                   zoom: int) -> Tuple[List[Dict[str, Any]], np.ndarray]:
+    """Group positions into grid clusters.
+
+    Returns the clusters and the indices of positions to show as
+    individual markers.
+    """
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    if lats.size == 0 or zoom >= CLUSTER_MAX_ZOOM:
+        return [], np.arange(lats.size)
+
+    size = cell_size(zoom)
+    cells = np.column_stack([np.floor(lats / size), np.floor(lons / size)])
+    _, inverse, counts = np.unique(cells, axis=0, return_inverse=True, return_counts=True)
+    inverse = inverse.ravel()
+
+    groups = np.flatnonzero(counts > 1)
+    clustered = counts[inverse] > 1
+    if groups.size == 0:
+        return [], np.flatnonzero(~clustered)
+
+    mean_lat = np.bincount(inverse, weights=lats) / counts
+    mean_lon = np.bincount(inverse, weights=lons) / counts
+    min_lat = np.full(counts.size, np.inf)
+    max_lat = np.full(counts.size, -np.inf)
+    min_lon = np.full(counts.size, np.inf)
+    max_lon = np.full(counts.size, -np.inf)
+    np.minimum.at(min_lat, inverse, lats)
+    np.maximum.at(max_lat, inverse, lats)
+    np.minimum.at(min_lon, inverse, lons)
+    np.maximum.at(max_lon, inverse, lons)
+
+    clusters = [
+        {
+            "position": [round(float(mean_lat[g]), 5), round(float(mean_lon[g]), 5)],
+            "count": int(counts[g]),
+            "bounds": [[float(min_lat[g]), float(min_lon[g])], [float(max_lat[g]), float(max_lon[g])]]
+        }
+        for g in groups
+    ]
+    return clusters, np.flatnonzero(~clustered)
+
+
+def float_marker(platform_number: str, juld, parameters, float_id: Optional[int] = None) -> Dict[str, Any]:
+    """Data and popup of an individual float marker"""
+    data = {
+        "platform_number": platform_number,
+        "date": juld.isoformat() if juld else None,
+        "parameters": parameters
+    }
+    if float_id is not None:
+        data["id"] = float_id
+    return {"popup": f"Float {platform_number}", "data": data}
+
+
+def clustered_map_data(lats: Sequence[float], lons: Sequence[float],
+                       markers_for: Callable[[List[int]], List[Dict[str, Any]]],
+                       zoom: int = DEFAULT_ZOOM) -> Optional[Dict[str, Any]]:
+    """Map payload of clusters plus individual markers for the lone positions.
+
+    markers_for(indices) returns the popup/data of the positions at those
+    indices, in order; it only sees positions that end up unclustered.
+    """
+    if len(lats) == 0:
+        return None
+    clusters, singles = cluster_points(lats, lons, zoom)
+    singles = singles.tolist()
+    return {
+        "center": [float(np.mean(lats)), float(np.mean(lons))],
+        "zoom": zoom,
+        "clusters": clusters,
+        "markers": [
+            {"position": [lats[i], lons[i]], **marker}
+            for i, marker in zip(singles, markers_for(singles))
+        ]
+    }
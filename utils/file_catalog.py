@@ -0,0 +1,211 @@
+"""Persistent catalog of the raw NetCDF files under data/<year>/<month>/.
+
+Reconciling compares each file's size and mtime with its catalog entry and
+only hashes and re-parses files that are new or changed, so repeated scans
+of an unchanged tree cost one stat() per file. Besides the file entry, the
+header of every profile is kept, so multi-profile *_prof.nc files
+contribute all of their positions.
+
+Reconcile from the command line with:
+
+    python -m utils.file_catalog [data_dir]
+"""
+import hashlib
+import os
+import sys
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import func, insert, update
+
+from models import DataFile, DataFileProfile
+from utils.ingest import read_headers
+from utils.map_render import render_cache
+
+HASH_CHUNK_SIZE = 1024 * 1024
+ID_BATCH_SIZE = 500
+PROFILE_FIELDS = ('platform_number', 'cycle_number', 'juld', 'latitude', 'longitude')
+
+
+def iter_data_files(data_dir: str) -> Iterator[Tuple[str, os.stat_result]]:
+    """Yield (relative path, stat) for every .nc file in data_dir/<year>/<month>/"""
+    if not os.path.isdir(data_dir):
+        return
+    for year in sorted(os.listdir(data_dir)):
+        year_dir = os.path.join(data_dir, year)
+        if not (year.isdigit() and len(year) == 4 and os.path.isdir(year_dir)):
+            continue
+        for month in sorted(os.listdir(year_dir)):
+            month_dir = os.path.join(year_dir, month)
+            if not os.path.isdir(month_dir):
+                continue
+            for entry in os.scandir(month_dir):
+                if entry.name.endswith('.nc') and entry.is_file():
+                    yield os.path.join(year, month, entry.name), entry.stat()
+
+
+def file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def reconcile_catalog(db, data_dir: str) -> Dict[str, int]:
+    """Bring the catalog for data_dir in line with the files on disk.
+
+    Files are hashed and their headers read with no transaction open, so
+    the writer connection is only held for the short final write.
+    """
+    root = os.path.abspath(data_dir)
+    entries = {entry.path: entry for entry in db.query(
+        DataFile.id, DataFile.path, DataFile.size, DataFile.mtime, DataFile.content_hash, DataFile.error
+    ).filter(DataFile.root == root)}
+    # Entries cataloged before profile headers were kept have none yet and
+    # are read again even when the file is unchanged
+    profiled = {row.file_id for row in db.query(DataFileProfile.file_id).join(
+        DataFile, DataFile.id == DataFileProfile.file_id
+    ).filter(DataFile.root == root).distinct()}
+    db.rollback()
+
+    stats = {"added": 0, "updated": 0, "unchanged": 0, "removed": 0, "errors": 0}
+    touched = []
+    changed = []
+    seen = set()
+    for rel_path, stat in iter_data_files(data_dir):
+        seen.add(rel_path)
+        entry = entries.get(rel_path)
+        current = entry is not None and (entry.id in profiled or entry.error is not None)
+        if current and entry.size == stat.st_size and entry.mtime == stat.st_mtime:
+            stats["unchanged"] += 1
+            continue
+
+        full_path = os.path.join(data_dir, rel_path)
+        content_hash = file_hash(full_path)
+        if current and entry.content_hash == content_hash:
+            # Touched but identical, nothing to re-parse
+            touched.append({"id": entry.id, "size": stat.st_size, "mtime": stat.st_mtime})
+            stats["unchanged"] += 1
+            continue
+
+        stats["updated" if entry else "added"] += 1
+        changed.append({
+            "id": entry.id if entry else None, "path": rel_path, "size": stat.st_size,
+            "mtime": stat.st_mtime, "content_hash": content_hash, "full_path": full_path
+        })
+    removed = [entry.id for rel_path, entry in entries.items() if rel_path not in seen]
+    stats["removed"] = len(removed)
+
+    # Only new or modified files are read, and only their headers; the
+    # file entry keeps the header of the first profile and every profile
+    # gets its own position
+    results = read_headers([change["full_path"] for change in changed])
+
+    now = datetime.now()
+    try:
+        if touched:
+            db.execute(update(DataFile), touched)
+        replaced = [change["id"] for change in changed if change["id"] is not None]
+        stale_days = _drop_profiles(db, replaced + removed)
+        for start in range(0, len(removed), ID_BATCH_SIZE):
+            db.query(DataFile).filter(DataFile.id.in_(removed[start:start + ID_BATCH_SIZE])).delete(
+                synchronize_session=False
+            )
+
+        existing = {}
+        for start in range(0, len(replaced), ID_BATCH_SIZE):
+            existing.update((entry.id, entry) for entry in db.query(DataFile).filter(
+                DataFile.id.in_(replaced[start:start + ID_BATCH_SIZE])
+            ))
+        files = []
+        for change, result in zip(changed, results):
+            entry = existing.get(change["id"])
+            if entry is None:
+                entry = DataFile(root=root, path=change["path"])
+                db.add(entry)
+            entry.size, entry.mtime, entry.content_hash = change["size"], change["mtime"], change["content_hash"]
+            entry.scanned_at = now
+            headers = result.get("data")
+            if headers is None:
+                entry.error = result.get("error")
+                stats["errors"] += 1
+                continue
+            entry.error = None
+            for field in ('platform_number', 'cycle_number', 'juld', 'latitude', 'longitude', 'parameters'):
+                setattr(entry, field, headers[0][field])
+            files.append((entry, headers))
+        db.flush()
+
+        rows = [
+            {"file_id": entry.id, **{field: header[field] for field in PROFILE_FIELDS}}
+            for entry, headers in files for header in headers
+        ]
+        if rows:
+            db.execute(insert(DataFileProfile), rows)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    _invalidate_renders(stale_days + [row["juld"] for row in rows])
+    return stats
+
+
+def _drop_profiles(db, ids: List[int]) -> List[Optional[datetime]]:
+    """Delete the profile headers of replaced or removed entries, returning the days they covered"""
+    days = []
+    for start in range(0, len(ids), ID_BATCH_SIZE):
+        batch = ids[start:start + ID_BATCH_SIZE]
+        days.extend(row.juld for row in db.query(DataFile.juld).filter(DataFile.id.in_(batch)))
+        days.extend(row.juld for row in db.query(DataFileProfile.juld).filter(DataFileProfile.file_id.in_(batch)))
+        db.query(DataFileProfile).filter(DataFileProfile.file_id.in_(batch)).delete(synchronize_session=False)
+    return days
+
+
+def _invalidate_renders(julds: Iterable[Optional[datetime]]):
+    for date in {juld.strftime('%Y-%m-%d') for juld in julds if juld}:
+        render_cache.invalidate_date(date)
+
+
+def catalog_years(db, data_dir: str) -> List[int]:
+    """Years that have cataloged profiles with a known date"""
+    root = os.path.abspath(data_dir)
+    year = func.strftime('%Y', DataFileProfile.juld)
+    rows = db.query(year).join(DataFile, DataFile.id == DataFileProfile.file_id).filter(
+        DataFile.root == root, DataFileProfile.juld.isnot(None)
+    ).distinct().all()
+    return sorted(int(row[0]) for row in rows)
+
+
+def positions_for_day(db, data_dir: str, target_date: str) -> Tuple[List[float], List[float]]:
+    """Positions of cataloged profiles whose juld falls on target_date (YYYY-MM-DD)"""
+    root = os.path.abspath(data_dir)
+    day = datetime.strptime(target_date, '%Y-%m-%d')
+    rows = db.query(DataFileProfile.latitude, DataFileProfile.longitude).join(
+        DataFile, DataFile.id == DataFileProfile.file_id
+    ).filter(
+        DataFile.root == root,
+        DataFileProfile.juld >= day, DataFileProfile.juld < day + timedelta(days=1),
+        DataFileProfile.latitude.isnot(None), DataFileProfile.longitude.isnot(None)
+    ).order_by(DataFileProfile.juld).all()
+    return [row.latitude for row in rows], [row.longitude for row in rows]
+
+
+if __name__ == "__main__":
+    from database import SessionLocal, engine
+    from migrations import run_migrations
+    from models import Base
+    from utils.ingest import DATA_DIR, shutdown_parse_pool
+
+    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+
+    target_dir = sys.argv[1] if len(sys.argv) > 1 else DATA_DIR
+    session = SessionLocal()
+    try:
+        result = reconcile_catalog(session, target_dir)
+        print(f"Reconciled {target_dir}: " + ", ".join(f"{count} {name}" for name, count in result.items()))
+        print(f"Years: {', '.join(map(str, catalog_years(session, target_dir))) or 'none'}")
+    finally:
+        session.close()
+        shutdown_parse_pool()
@@ -0,0 +1,92 @@
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import load_only
+
+from models import ArgoFloat
+from utils.metrics import note, stage
+from schemas import FloatResponse
+
+FLOAT_FIELDS = list(FloatResponse.model_fields)
+DEFAULT_PAGE_SIZE = 1000
+MAX_PAGE_SIZE = 10000
+
+# Time filters are half-open juld ranges, [start, end), so that SQLite can
+# use ix_argo_floats_juld instead of evaluating strftime() on every row.
+
+
+def year_range(year: int) -> Tuple[datetime, datetime]:
+    return datetime(year, 1, 1), datetime(year + 1, 1, 1)
+
+
+def month_range(year: int, month: int) -> Tuple[datetime, datetime]:
+    if not 1 <= month <= 12:
+        raise ValueError("month must be between 1 and 12")
+    start = datetime(year, month, 1)
+    end = datetime(year + 1, 1, 1) if month == 12 else datetime(year, month + 1, 1)
+    return start, end
+
+
+def time_range(year: Optional[int] = None, month: Optional[int] = None,
+               start: Optional[datetime] = None, end: Optional[datetime] = None):
+    """Combine year/month and explicit start/end into one [start, end) range.
+
+    Either bound may be None for an open-ended range. Raises ValueError for
+    an invalid combination.
+    """
+    if month and not year:
+        raise ValueError("month requires year")
+    if year:
+        period_start, period_end = month_range(year, month) if month else year_range(year)
+        start = max(start, period_start) if start else period_start
+        end = min(end, period_end) if end else period_end
+    if start and end and start >= end:
+        raise ValueError("start must be before end")
+    return start, end
+
+
+def apply_time_range(query, start: Optional[datetime], end: Optional[datetime]):
+    """Filter an ArgoFloat query to juld within [start, end)"""
+    if start:
+        query = query.filter(ArgoFloat.juld >= start)
+    if end:
+        query = query.filter(ArgoFloat.juld < end)
+    return query
+
+
+def parse_fields(fields: Optional[str]) -> List[str]:
+    """Validate a comma separated fields= projection; id is always included"""
+    if not fields:
+        return FLOAT_FIELDS
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in names if name not in FLOAT_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}. Expected any of: {', '.join(FLOAT_FIELDS)}")
+    return ['id'] + [name for name in names if name != 'id']
+
+
+def float_columns_select(fields: List[str]):
+    """Select only the listed ArgoFloat columns, never the profile payloads"""
+    return select(*[getattr(ArgoFloat, name) for name in fields])
+
+
+def float_summary_options():
+    """Loader option restricting a full ArgoFloat load to FloatResponse columns"""
+    return load_only(*[getattr(ArgoFloat, name) for name in FLOAT_FIELDS])
+
+
+async def fetch_page(db, stmt, cursor: Optional[int], limit: int) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+    """Keyset-paginate a column select by id on an AsyncSession.
+
+    Returns the rows as dicts and the cursor for the next page, or None
+    when this is the last page.
+    """
+    if cursor is not None:
+        stmt = stmt.filter(ArgoFloat.id > cursor)
+    with stage("db_query"):
+        rows = (await db.execute(stmt.order_by(ArgoFloat.id).limit(limit + 1))).all()
+    items = [row._asdict() for row in rows[:limit]]
+    note(rows=len(items))
+    next_cursor = items[-1]['id'] if len(rows) > limit else None
+    return items, next_cursor
@@ -0,0 +1,485 @@
+import os
+import queue
+import shutil
+import tarfile
+import tempfile
+import threading
+import uuid
+import zipfile
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Callable, Dict, List, Any, Optional, Tuple
+
+from fastapi import UploadFile
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select, tuple_
+
+from database import SessionLocal, dialect_insert
+from models import ArgoFloat
+from utils.climatology import apply_contributions, profile_contributions
+from utils.map_render import render_cache, shutdown_render_pool
+from utils.metrics import collect_stages, record_stage, stage
+from utils.netcdf_parser import HEADER, parse_netcdf_profiles
+from utils.profile_lod import profile_tiers
+from utils.profile_store import encode_profile
+from utils.response_cache import bump_data_version
+
+DATA_DIR = "data"
+# Per-job directories holding uploads until they are stored
+STAGING_DIR = os.path.join(DATA_DIR, "staging")
+INGEST_BATCH_SIZE = int(os.getenv("OCEAN_INGEST_BATCH_SIZE", "200"))
+PARSE_WORKERS = int(os.getenv("OCEAN_PARSE_WORKERS", "0")) or os.cpu_count()
+INGEST_WORKERS = int(os.getenv("OCEAN_INGEST_WORKERS", "2"))
+INGEST_QUEUE_SIZE = int(os.getenv("OCEAN_INGEST_QUEUE_SIZE", "16"))
+INGEST_JOB_HISTORY = 1000
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+NETCDF_EXTENSIONS = ('.nc', '.nc4', '.cdf')
+ARCHIVE_EXTENSIONS = ('.zip', '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tar.xz')
+
+_parse_pool = None
+
+
+def get_parse_pool():
+    """Return the shared process pool used for NetCDF parsing"""
+    global _parse_pool
+    if _parse_pool is None:
+        _parse_pool = ProcessPoolExecutor(max_workers=PARSE_WORKERS)
+    return _parse_pool
+
+
+def shutdown_parse_pool():
+    """Stop the parse pool, waiting for running jobs to finish"""
+    global _parse_pool
+    if _parse_pool is not None:
+        _parse_pool.shutdown(wait=True)
+        _parse_pool = None
+
+
+def is_netcdf(name: str) -> bool:
+    return name.lower().endswith(NETCDF_EXTENSIONS)
+
+
+def is_archive(name: str) -> bool:
+    return name.lower().endswith(ARCHIVE_EXTENSIONS)
+
+
+async def save_upload(upload: UploadFile, file_path: str, chunk_size: int = UPLOAD_CHUNK_SIZE):
+    """Stream an upload to disk in chunks without blocking the event loop"""
+    buffer = await run_in_threadpool(open, file_path, "wb")
+    try:
+        while True:
+            chunk = await upload.read(chunk_size)
+            if not chunk:
+                break
+            await run_in_threadpool(buffer.write, chunk)
+    finally:
+        await run_in_threadpool(buffer.close)
+
+
+async def stage_uploads(uploads: List[UploadFile]):
+    """Save uploads to a staging directory of their own, expanding archives into their NetCDF members.
+
+    Returns the paths ready for parsing and error entries for uploads
+    that were rejected up front. Files only reach DATA_DIR through
+    publish_staged() once stored, so concurrent jobs uploading the same
+    file name never overwrite each other's input.
+    """
+    os.makedirs(STAGING_DIR, exist_ok=True)
+    staging_dir = await run_in_threadpool(tempfile.mkdtemp, dir=STAGING_DIR)
+    paths, report = [], []
+    for upload in uploads:
+        file_name = os.path.basename(upload.filename or "")
+        if not (is_netcdf(file_name) or is_archive(file_name)):
+            report.append({"file": file_name, "status": "error", "error": "Unsupported file type"})
+            continue
+        file_path = os.path.join(staging_dir, file_name)
+        with stage("file_write"):
+            await save_upload(upload, file_path)
+        if is_archive(file_name):
+            try:
+                paths.extend(await run_in_threadpool(extract_archive, file_path, staging_dir))
+            except Exception as e:
+                report.append({"file": file_name, "status": "error", "error": f"Invalid archive: {str(e)}"})
+            finally:
+                os.remove(file_path)
+        else:
+            paths.append(file_path)
+    if not paths:
+        os.rmdir(staging_dir)
+    return paths, report
+
+
+def publish_staged(file_paths: List[str], results: List[Dict[str, Any]]):
+    """Move the files that were stored into DATA_DIR and drop their staging directories"""
+    for path, result in zip(file_paths, results):
+        if result["status"] == "ok":
+            os.replace(path, os.path.join(DATA_DIR, os.path.basename(path)))
+    discard_staged(file_paths)
+
+
+def discard_staged(file_paths: List[str]):
+    """Remove the staging directories of files that will not be published"""
+    for directory in {os.path.dirname(path) for path in file_paths}:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def extract_archive(archive_path: str, dest_dir: str) -> List[str]:
+    """Extract the NetCDF members of a zip/tar archive into dest_dir.
+
+    Members are flattened to their base name so that archive paths can
+    never escape dest_dir.
+    """
+    extracted = []
+    if zipfile.is_zipfile(archive_path):
+        with zipfile.ZipFile(archive_path) as archive:
+            for member in archive.infolist():
+                name = os.path.basename(member.filename)
+                if member.is_dir() or not is_netcdf(name):
+                    continue
+                target = os.path.join(dest_dir, name)
+                with archive.open(member) as src, open(target, "wb") as dst:
+                    shutil.copyfileobj(src, dst)
+                extracted.append(target)
+    else:
+        with tarfile.open(archive_path) as archive:
+            for member in archive.getmembers():
+                name = os.path.basename(member.name)
+                if not member.isfile() or not is_netcdf(name):
+                    continue
+                target = os.path.join(dest_dir, name)
+                src = archive.extractfile(member)
+                with src, open(target, "wb") as dst:
+                    shutil.copyfileobj(src, dst)
+                extracted.append(target)
+    return extracted
+
+
+def parse_file(file_path: str) -> Dict[str, Any]:
+    """Parse one NetCDF file into a picklable per-file result.
+
+    Runs inside the parse pool, so it never raises: errors are reported
+    in the returned dict instead. "data" holds one entry per profile and
+    "timings" the stage durations, for the parent to record.
+    """
+    file_name = os.path.basename(file_path)
+    with collect_stages() as timings:
+        try:
+            profiles = parse_netcdf_profiles(file_path)
+        except Exception as e:
+            return {"file": file_name, "status": "error", "error": str(e), "timings": timings}
+        with stage("encode_profile"):
+            for parsed in profiles:
+                # Pack the profile arrays and LOD tiers here so the work runs in the pool
+                profile = parsed.pop('profile_data')
+                parsed['profile_blob'] = encode_profile(profile, profile_tiers(profile))
+                parsed['profile_data'] = None
+    return {"file": file_name, "status": "parsed", "data": profiles, "timings": timings}
+
+
+def parse_files(file_paths: List[str]) -> List[Dict[str, Any]]:
+    """Parse many files across all cores, preserving input order"""
+    if not file_paths:
+        return []
+    pool = get_parse_pool()
+    return [_record_timings(result) for result in pool.map(parse_file, file_paths)]
+
+
+def _record_timings(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Record the stage timings a pool process sent back with a parse result"""
+    for name, seconds in result.pop("timings", {}).items():
+        record_stage(name, seconds)
+    return result
+
+
+def read_header(file_path: str) -> Dict[str, Any]:
+    """Per-file result holding only the metadata of every profile.
+
+    Runs inside the parse pool like parse_file, but never reads the
+    profile arrays.
+    """
+    file_name = os.path.basename(file_path)
+    try:
+        headers = parse_netcdf_profiles(file_path, mode=HEADER)
+    except Exception as e:
+        return {"file": file_name, "status": "error", "error": str(e)}
+    return {"file": file_name, "status": "parsed", "data": headers}
+
+
+def read_headers(file_paths: List[str]) -> List[Dict[str, Any]]:
+    """Read the headers of many files across all cores, preserving input order"""
+    if not file_paths:
+        return []
+    return list(get_parse_pool().map(read_header, file_paths))
+
+
+def upsert_profiles(db, profiles: List[Dict[str, Any]], batch_size: int = INGEST_BATCH_SIZE,
+                    on_error: Optional[Callable[[int, int, Exception], None]] = None) -> List[Optional[str]]:
+    """Insert or replace parsed profiles keyed on (platform_number, cycle_number).
+
+    Profiles are written batch_size at a time, one INSERT ... ON CONFLICT
+    DO UPDATE per batch, and committed after each batch. Returns "added"
+    or "updated" for every profile, in order. A failed batch is rolled
+    back and raised, or with on_error reported as on_error(start, end,
+    error) while its profiles get None and the next batches go on.
+    """
+    actions = []
+    for start in range(0, len(profiles), batch_size):
+        batch = profiles[start:start + batch_size]
+        try:
+            with stage("db_upsert"):
+                batch_actions = _upsert_batch(db, batch)
+            with stage("db_commit"):
+                db.commit()
+        except Exception as e:
+            db.rollback()
+            if on_error is None:
+                raise
+            on_error(start, start + len(batch), e)
+            actions.extend([None] * len(batch))
+            continue
+        actions.extend(batch_actions)
+        bump_data_version()
+    _invalidate_rendered_days(profiles)
+    return actions
+
+
+def store_parsed(db, results: List[Dict[str, Any]], batch_size: int = INGEST_BATCH_SIZE) -> List[Dict[str, Any]]:
+    """Write parsed results to the database in batched transactions.
+
+    Batches hold up to batch_size profiles, so a multi-profile file may
+    span several of them. Each entry of results is updated in place with
+    its final status and returned as the per-file report.
+    """
+    profiles = [
+        (result, data)
+        for result in results if result["status"] == "parsed"
+        for data in result["data"]
+    ]
+
+    def failed(start, end, error):
+        for result, _ in profiles[start:end]:
+            result["status"] = "error"
+            result["error"] = f"Database error: {str(error)}"
+
+    actions = upsert_profiles(db, [dict(data, file_name=result["file"]) for result, data in profiles],
+                              batch_size, on_error=failed)
+    for (result, _), action in zip(profiles, actions):
+        if action is not None:
+            result.setdefault("actions", []).append(action)
+
+    report = []
+    for result in results:
+        profiles = result.pop("data", None) or []
+        actions = result.pop("actions", [])
+        if len(profiles) == 1:
+            result["platform_number"] = profiles[0]['platform_number']
+            result["cycle_number"] = profiles[0]['cycle_number']
+        elif profiles:
+            result["profiles"] = len(profiles)
+        if result["status"] == "parsed":
+            result["status"] = "ok"
+            if len(profiles) == 1:
+                result["action"] = actions[0]
+            else:
+                result["added"] = actions.count("added")
+                result["updated"] = actions.count("updated")
+        report.append(result)
+    return report
+
+
+def _invalidate_rendered_days(profiles: List[Dict[str, Any]]):
+    for date in {data['juld'].strftime('%Y-%m-%d') for data in profiles if data['juld']}:
+        render_cache.invalidate_date(date)
+
+
+def _upsert_batch(db, profiles: List[Dict[str, Any]]) -> List[str]:
+    """Upsert one batch of parsed profiles through Core, without ORM objects.
+
+    Only the columns the climatology needs are read back from the rows
+    being replaced; the rows themselves are written by one executemany
+    INSERT ... ON CONFLICT DO UPDATE, which fires the same triggers as
+    plain inserts and updates.
+    """
+    key_columns = (ArgoFloat.platform_number, ArgoFloat.cycle_number)
+    keys = [(data['platform_number'], data['cycle_number']) for data in profiles]
+    existing = db.connection().execute(
+        select(*key_columns, ArgoFloat.juld, ArgoFloat.latitude, ArgoFloat.longitude,
+               ArgoFloat.profile_blob, ArgoFloat.profile_data)
+        .where(tuple_(*key_columns).in_(set(keys)))
+    ).all()
+
+    # Profiles being replaced leave the climatology as their successors join it
+    replaced = profile_contributions(existing)
+
+    now = datetime.now()
+    columns = list(dict.fromkeys(column for data in profiles for column in data))
+    for column in ('date_created', 'date_updated'):
+        if column not in columns:
+            columns.append(column)
+    seen = {(row.platform_number, row.cycle_number) for row in existing}
+    actions = []
+    # Last row per key: PostgreSQL rejects an ON CONFLICT DO UPDATE that
+    # touches the same row twice, e.g. a file and its update in one zip
+    touched = {}
+    for i, (key, data) in enumerate(zip(keys, profiles)):
+        row = {column: data.get(column) for column in columns}
+        # Ingest time, as before; the file's DATE_CREATION is not kept
+        row['date_created'] = now
+        row['date_updated'] = now
+        actions.append("updated" if key in seen else "added")
+        # NULL cycle numbers never conflict, so each such profile is a new row
+        if key[1] is not None:
+            seen.add(key)
+            touched[key] = row
+        else:
+            touched[i] = row
+
+    stmt = dialect_insert(db, ArgoFloat.__table__)
+    key_names = [column.name for column in key_columns]
+    stmt = stmt.on_conflict_do_update(
+        index_elements=key_names,
+        # A replaced profile keeps the creation date of its first ingest
+        set_={column: stmt.excluded[column] for column in columns if column not in key_names + ['date_created']}
+    )
+    db.connection().execute(stmt, list(touched.values()))
+    apply_contributions(
+        db, added=profile_contributions(SimpleNamespace(**row) for row in touched.values()), removed=replaced
+    )
+    return actions
+
+
+class IngestQueueFull(Exception):
+    """Raised when the ingest queue cannot accept another job"""
+
+
+class IngestJob:
+    """Progress of one upload moving through the ingest pipeline"""
+
+    def __init__(self, file_paths: List[str], report: List[Dict[str, Any]] = None):
+        self.id = uuid.uuid4().hex
+        self.file_paths = file_paths
+        self.report = list(report or [])
+        self.files_total = len(file_paths) + len(self.report)
+        self.status = "queued"
+        self.files_parsed = 0
+        self.error = None
+        self.created_at = datetime.now()
+        self.finished_at = None
+        self.future = Future()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "files_total": self.files_total,
+            "files_parsed": self.files_parsed,
+            "created_at": self.created_at.isoformat(),
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "error": self.error,
+            "files": self.report if self.status in ("done", "failed") else None
+        }
+
+
+class IngestQueue:
+    """Bounded queue of ingest jobs drained by a small pool of worker threads.
+
+    Parsing is fanned out to the shared process pool; each worker then
+    writes its job's results through its own database session.
+    """
+
+    def __init__(self, workers: int = INGEST_WORKERS, maxsize: int = INGEST_QUEUE_SIZE):
+        self.workers = workers
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def full(self) -> bool:
+        return self._queue.full()
+
+    def submit(self, file_paths: List[str], report: List[Dict[str, Any]] = None) -> IngestJob:
+        """Queue files for parsing and storage, or raise IngestQueueFull"""
+        self._ensure_workers()
+        job = IngestJob(file_paths, report)
+        with self._lock:
+            self._jobs[job.id] = job
+            while len(self._jobs) > INGEST_JOB_HISTORY:
+                oldest_id, oldest = next(iter(self._jobs.items()))
+                if oldest.status not in ("done", "failed"):
+                    break
+                del self._jobs[oldest_id]
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                self._jobs.pop(job.id, None)
+            raise IngestQueueFull("Ingest queue is full, retry later")
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def shutdown(self):
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def _ensure_workers(self):
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f"ingest-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                break
+            try:
+                self._process(job)
+            except Exception as e:
+                job.status = "failed"
+                job.error = str(e)
+            job.finished_at = datetime.now()
+            job.future.set_result(job)
+
+    def _process(self, job: IngestJob):
+        try:
+            job.status = "parsing"
+            pool = get_parse_pool()
+            futures = {pool.submit(parse_file, path): i for i, path in enumerate(job.file_paths)}
+            results = [None] * len(futures)
+            for future in as_completed(futures):
+                results[futures[future]] = _record_timings(future.result())
+                job.files_parsed += 1
+
+            job.status = "storing"
+            db = SessionLocal()
+            try:
+                job.report.extend(store_parsed(db, results))
+            finally:
+                db.close()
+        except Exception:
+            discard_staged(job.file_paths)
+            raise
+        publish_staged(job.file_paths, results)
+        job.status = "done"
+
+
+ingest_queue = IngestQueue()
+
+
+def shutdown_ingest():
+    """Drain the ingest workers and stop the parse and render pools"""
+    ingest_queue.shutdown()
+    shutdown_parse_pool()
+    shutdown_render_pool()
@@ -0,0 +1,100 @@
+import re
+from typing import Any, Dict
+
+MONTHS = ['january', 'february', 'march', 'april', 'may', 'june', 'july',
+          'august', 'september', 'october', 'november', 'december']
+
+PARAM_KEYWORDS = {
+    'temperature': 'TEMP', 'temperatures': 'TEMP', 'temp': 'TEMP', 'temps': 'TEMP', 'thermal': 'TEMP',
+    'salinity': 'PSAL', 'salt': 'PSAL', 'saline': 'PSAL',
+    'pressure': 'PRES', 'pressures': 'PRES', 'depth': 'PRES', 'depths': 'PRES', 'pres': 'PRES',
+    'deep': 'PRES'
+}
+REGION_KEYWORDS = {
+    'arabian': 'Arabian Sea', 'arabian sea': 'Arabian Sea',
+    'bengal': 'Bay of Bengal', 'bay of bengal': 'Bay of Bengal',
+    'indian': 'Indian Ocean', 'indian ocean': 'Indian Ocean'
+}
+# Phrases deciding the query kind, in order of precedence
+KIND_KEYWORDS = {
+    'greeting': ['hello', 'hi', 'hey', 'greetings'],
+    'help': ['help', 'what can you do', 'capabilities'],
+    'data': ['show', 'display', 'find', 'get', 'what is'],
+    'comparison': ['compare', 'difference', 'versus', 'vs'],
+    'listing': ['list', 'all floats', 'available']
+}
+
+_KEYWORDS = {}
+for _kind, _phrases in KIND_KEYWORDS.items():
+    for _phrase in _phrases:
+        _KEYWORDS[_phrase] = ('kind', _kind)
+for _keyword, _param in PARAM_KEYWORDS.items():
+    _KEYWORDS[_keyword] = ('param', _param)
+for _keyword, _region in REGION_KEYWORDS.items():
+    _KEYWORDS[_keyword] = ('region', _region)
+
+
+def _alternation(phrases) -> str:
+    # Longest first so "bay of bengal" wins over "bengal"
+    return "|".join(re.escape(p).replace(r"\ ", r"\s+") for p in sorted(phrases, key=len, reverse=True))
+
+
+_MONTH = _alternation(MONTHS)
+
+# Every slot in one left-to-right scan. Alternatives are tried in order at
+# each position, so ranges claim their month/year pairs and depths claim
+# their numbers before the plain year rule sees them.
+_QUESTION_PATTERN = re.compile(rf"""
+    \b(?:from|between)\s+(?P<range_start>[a-z]+\s+\d{{4}})\s+(?:to|and)\s+(?P<range_end>[a-z]+\s+\d{{4}})\b
+  | \b(?P<month>{_MONTH})\s+(?P<month_year>\d{{4}})\b
+  | \b(?P<depth>\d+)\s*(?:m|meters?|metres?|depth)\b
+  | \b(?P<year>199\d|20\d\d)\b
+  | \b(?P<keyword>{_alternation(_KEYWORDS)})\b
+""", re.VERBOSE)
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def parse_question(question: str) -> Dict[str, Any]:
+    """Extract the query kind and all slots from a question in one pass"""
+    date_info = {}
+    year = None
+    kinds = set()
+    parameters = []
+    regions = []
+    depth = None
+
+    for match in _QUESTION_PATTERN.finditer(question.lower()):
+        group = match.lastgroup
+        if group == 'keyword':
+            slot, value = _KEYWORDS[_WHITESPACE.sub(" ", match.group('keyword'))]
+            if slot == 'kind':
+                kinds.add(value)
+            elif slot == 'param':
+                if value not in parameters:
+                    parameters.append(value)
+            elif value not in regions:
+                regions.append(value)
+        elif group == 'year':
+            year = year or int(match.group('year'))
+        elif group == 'depth':
+            depth = depth if depth is not None else int(match.group('depth'))
+        elif group == 'month_year':
+            if 'month' not in date_info:
+                date_info['month'] = match.group('month')
+                date_info['year'] = int(match.group('month_year'))
+        elif 'range' not in date_info:
+            date_info['range'] = {'start': match.group('range_start'), 'end': match.group('range_end')}
+
+    if year and 'year' not in date_info:
+        date_info['year'] = year
+
+    kind = next((k for k in KIND_KEYWORDS if k in kinds), 'default')
+    return {
+        "kind": kind,
+        "date_info": date_info,
+        "parameters": parameters,
+        "region": regions[0] if regions else None,
+        "regions": regions,
+        "depth": depth
+    }
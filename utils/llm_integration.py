@@ -1,5 +1,6 @@
 from typing import Dict, List, Any
 from .query_processor import ArgoQueryProcessor
+from .response_cache import intent_key, response_cache
 
 # Simple mock instead of actual LLM
 def init_llm(model_path):
@@ -11,6 +12,11 @@ def create_llm_chain(llm):
     return llm
 
 def generate_response(question, context, file_list, recent_queries, llm_chain, db_session):
-    """Generate response using the rule-based processor"""
+    """Generate response using the rule-based processor.
+
+    Responses are cached by parsed intent, so equivalent questions are only
+    answered from the database once per data version.
+    """
     processor = ArgoQueryProcessor(db_session)
-    return processor.process_query(question)
\ No newline at end of file
+    intent = processor.parse_intent(question)
+    return response_cache.get_or_compute(intent_key(intent), lambda: processor.answer(intent))
\ No newline at end of file
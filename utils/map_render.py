@@ -0,0 +1,217 @@
+import glob
+import hashlib
+import io
+import os
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, List, Optional, Tuple
+
+RENDER_CACHE_DIR = os.getenv("OCEAN_RENDER_CACHE_DIR", os.path.join("data", "render_cache"))
+RENDER_CACHE_MAX_BYTES = int(os.getenv("OCEAN_RENDER_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+RENDER_WORKERS = int(os.getenv("OCEAN_RENDER_WORKERS", "2"))
+
+RENDER_FORMATS = {"png": "image/png", "svg": "image/svg+xml"}
+STYLES = {
+    "default": {"track": "bo-", "coast": "black", "borders": "gray", "dpi": 100},
+    "light": {"track": "o-", "track_color": "#0ea5e9", "coast": "#64748b", "borders": "#cbd5e1", "dpi": 100},
+    "print": {"track": "ko-", "coast": "black", "borders": "black", "dpi": 200}
+}
+
+# Half-width of the automatic map window in degrees of longitude, matching
+# the original half-global view
+AUTO_EXTENT = 90
+
+Extent = Tuple[float, float, float, float]
+
+_pool = None
+_pool_lock = threading.Lock()
+
+# Cartopy geometries loaded once per render worker
+_features = {}
+
+
+def _init_worker():
+    """Configure a headless backend and load the map features once"""
+    import matplotlib
+    matplotlib.use("Agg")
+    import cartopy.feature as cfeature
+
+    for name, feature in (("coastline", cfeature.COASTLINE), ("borders", cfeature.BORDERS)):
+        try:
+            _features[name] = list(feature.geometries())
+        except Exception as e:
+            # Natural Earth data may be unavailable offline; draw without it
+            print(f"Could not load {name} features: {str(e)}")
+            _features[name] = []
+
+
+def get_render_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=RENDER_WORKERS, initializer=_init_worker)
+        return _pool
+
+
+def shutdown_render_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True)
+            _pool = None
+
+
+def parse_extent(value: str) -> Extent:
+    """Parse "lon_min,lon_max,lat_min,lat_max" as used by cartopy set_extent"""
+    parts = [float(p) for p in value.split(",")]
+    if len(parts) != 4:
+        raise ValueError("extent must be lon_min,lon_max,lat_min,lat_max")
+    lon_min, lon_max, lat_min, lat_max = parts
+    if not (-180 <= lon_min < lon_max <= 180 and -90 <= lat_min < lat_max <= 90):
+        raise ValueError("extent is outside the globe or empty")
+    return lon_min, lon_max, lat_min, lat_max
+
+
+def auto_extent(lats: List[float], lons: List[float]) -> Extent:
+    lon_center = (min(lons) + max(lons)) / 2
+    lat_center = (min(lats) + max(lats)) / 2
+    return (
+        max(lon_center - AUTO_EXTENT, -180), min(lon_center + AUTO_EXTENT, 180),
+        max(lat_center - AUTO_EXTENT / 2, -90), min(lat_center + AUTO_EXTENT / 2, 90)
+    )
+
+
+def render_trajectory_map(tracks: List[Tuple[List[float], List[float]]], title: str,
+                          extent: Extent, style: str, fmt: str) -> bytes:
+    """Render tracks of (lats, lons) to PNG/SVG bytes; runs in a render worker"""
+    import matplotlib.pyplot as plt
+    import cartopy.crs as ccrs
+
+    options = STYLES[style]
+    crs = ccrs.PlateCarree()
+    fig = plt.figure(figsize=(6, 4))
+    try:
+        ax = fig.add_subplot(1, 1, 1, projection=crs)
+        ax.add_geometries(_features.get("coastline", []), crs, facecolor="none",
+                          edgecolor=options["coast"], linewidth=0.6)
+        ax.add_geometries(_features.get("borders", []), crs, facecolor="none",
+                          edgecolor=options["borders"], linestyle=":", linewidth=0.5)
+        ax.gridlines(draw_labels=True, dms=True, x_inline=False, y_inline=False)
+        ax.set_extent(list(extent), crs=crs)
+        # The default and print formats carry their colour; passing color=None
+        # alongside them makes matplotlib warn on every render
+        color = {"color": options["track_color"]} if "track_color" in options else {}
+        for lats, lons in tracks:
+            ax.plot(lons, lats, options["track"], markersize=4, transform=crs, **color)
+        ax.set_title(title)
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format=fmt, dpi=options["dpi"], bbox_inches="tight")
+        return buffer.getvalue()
+    finally:
+        plt.close(fig)
+
+
+class RenderCache:
+    """On-disk LRU of rendered maps.
+
+    Files are named "<date>_<key hash>.<format>" so every image of a date
+    can be dropped when new data for that date arrives. Hits refresh the
+    file mtime, and the least recently used files are evicted once the
+    directory grows past max_bytes. Every invalidation bumps the date's
+    generation, so a render that raced with one is not stored.
+    """
+
+    def __init__(self, directory: str = RENDER_CACHE_DIR, max_bytes: int = RENDER_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._generations = {}
+
+    def path_for(self, date: str, key: tuple, fmt: str) -> str:
+        digest = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.directory, f"{date}_{digest}.{fmt}")
+
+    def get(self, path: str) -> Optional[str]:
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def generation(self, date: str) -> int:
+        with self._lock:
+            return self._generations.get(date, 0)
+
+    def put(self, path: str, content: bytes, date: Optional[str] = None,
+            generation: Optional[int] = None) -> str:
+        """Store an image and return the path to serve it from.
+
+        An image rendered from data read before the date's generation
+        changed is written under a one-off name instead, so it is served
+        this once and left to eviction.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(content)
+        with self._lock:
+            if generation is not None and self._generations.get(date, 0) != generation:
+                path = os.path.join(self.directory, f"uncached_{uuid.uuid4().hex}{os.path.splitext(path)[1]}")
+            os.replace(tmp_path, path)
+        self._evict()
+        return path
+
+    def invalidate_date(self, date: str):
+        with self._lock:
+            self._generations[date] = self._generations.get(date, 0) + 1
+            for path in glob.glob(os.path.join(glob.escape(self.directory), f"{date}_*")):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    def _evict(self):
+        with self._lock:
+            entries = []
+            for entry in os.scandir(self.directory):
+                if entry.is_file() and not entry.name.endswith(".tmp"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+
+
+render_cache = RenderCache()
+
+
+def cached_trajectory_map(date: str, source: str, load_tracks: Callable[[], list],
+                          extent: Optional[Extent] = None, style: str = "default",
+                          fmt: str = "png") -> Optional[str]:
+    """Return the path of a rendered trajectory map for a day, rendering on a miss.
+
+    load_tracks is only called on a cache miss and returns a list of
+    (lats, lons) tracks; None is returned when it yields no positions.
+    """
+    path = render_cache.path_for(date, (source, extent, style), fmt)
+    if render_cache.get(path):
+        return path
+
+    generation = render_cache.generation(date)
+    tracks = [(lats, lons) for lats, lons in load_tracks() if lats]
+    if not tracks:
+        return None
+    if extent is None:
+        extent = auto_extent([lat for lats, _ in tracks for lat in lats],
+                             [lon for _, lons in tracks for lon in lons])
+    content = get_render_pool().submit(
+        render_trajectory_map, tracks, f"Float Trajectory on {date}", extent, style, fmt
+    ).result()
+    return render_cache.put(path, content, date, generation)
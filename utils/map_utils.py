@@ -1,90 +1,79 @@
 import os
-import numpy as np
-import matplotlib.pyplot as plt
-import cartopy.crs as ccrs
-import cartopy.feature as cfeature
-from utils.netcdf_parser import parse_netcdf
+from typing import Dict, Any, List, Optional
+from utils.clustering import DEFAULT_ZOOM, clustered_map_data, float_marker
+from utils.map_render import cached_trajectory_map
 
-def plot_trajectory_for_day(data_dir, target_date):
+MARKER_BATCH_SIZE = 500
+
+def collect_positions_for_day(data_dir, target_date):
+    """Positions recorded on target_date by the .nc files in data_dir/<year>/<month>/.
+
+    The file catalog is reconciled first, so only new or changed files are
+    parsed; everything else is answered from the catalog.
     """
-    Plot the trajectory of floats for a specific day using .nc files in data_dir.
-    Returns: response string and shows the plot.
+    from database import SessionLocal
+    from utils.file_catalog import positions_for_day, reconcile_catalog
+
+    db = SessionLocal()
+    try:
+        reconcile_catalog(db, data_dir)
+        return positions_for_day(db, data_dir, target_date)
+    finally:
+        db.close()
+
+def plot_trajectory_for_day(data_dir, target_date, extent=None, style="default", fmt="png") -> Optional[str]:
     """
-    lats, lons = [], []
-    for year in ['2024', '2025']:
-        year_dir = os.path.join(data_dir, year)
-        if not os.path.exists(year_dir):
-            continue
-        for month in os.listdir(year_dir):
-            month_dir = os.path.join(year_dir, month)
-            if not os.path.isdir(month_dir):
-                continue
-            for fname in os.listdir(month_dir):
-                if fname.endswith('.nc'):
-                    data = parse_netcdf(os.path.join(month_dir, fname))
-                    file_date = data.get('juld')
-                    if file_date and file_date.strftime('%Y-%m-%d') == target_date:
-                        if data['latitude'] is not None and data['longitude'] is not None:
-                            lats.append(data['latitude'])
-                            lons.append(data['longitude'])
-    if lats and lons:
-        fig = plt.figure(figsize=(6, 4))
-        ax = fig.add_subplot(1, 1, 1, projection=ccrs.PlateCarree())
-        ax.coastlines()
-        ax.add_feature(cfeature.BORDERS, linestyle=":")
-        ax.gridlines(draw_labels=True, dms=True, x_inline=False, y_inline=False)
-        lon_center = (np.nanmin(lons) + np.nanmax(lons)) / 2
-        lat_center = (np.nanmin(lats) + np.nanmax(lats)) / 2
-        global_extent = 90
-        ax.set_extent([
-            lon_center - global_extent, lon_center + global_extent,
-            lat_center - global_extent/2, lat_center + global_extent/2
-        ], crs=ccrs.PlateCarree())
-        ax.plot(lons, lats, "bo-", markersize=4, transform=ccrs.PlateCarree())
-        ax.set_title(f"Float Trajectory on {target_date}")
-        plt.show()
-        return "📍 Showing trajectory map (half-global view)"
-    else:
-        return "⚠️ No trajectory data for this date."
-from typing import Dict, Any, List
+    Render the trajectory of floats for a specific day using .nc files in data_dir.
+    Returns: path of the cached PNG/SVG image, or None when there is no data.
+    """
+    return cached_trajectory_map(
+        target_date, f"dir:{os.path.abspath(data_dir)}",
+        lambda: [collect_positions_for_day(data_dir, target_date)],
+        extent=extent, style=style, fmt=fmt
+    )
 
-def generate_map_data(question: str, context: Dict[str, Any], db) -> Dict[str, Any]:
-    """Generate map data based on the query and context"""
-    map_data = {
-        "center": [20, 80],  # Default center (Arabian Sea)
-        "zoom": 4,
-        "markers": []
-    }
-    
-    # Add markers for each float in context
-    for float_data in context.get('floats', []):
-        if float_data['latitude'] and float_data['longitude']:
-            marker = {
-                "position": [float_data['latitude'], float_data['longitude']],
-                "popup": f"Float {float_data['platform_number']}",
+def generate_map_data(question: str, context: Dict[str, Any], db, zoom: int = DEFAULT_ZOOM) -> Dict[str, Any]:
+    """Generate clustered map data based on the query and context"""
+    located = [f for f in context.get('floats', []) if f['latitude'] and f['longitude']]
+    if located:
+        lats = [f['latitude'] for f in located]
+        lons = [f['longitude'] for f in located]
+        markers_for = lambda indices: [
+            {
+                "popup": f"Float {f['platform_number']}",
                 "data": {
-                    "platform_number": float_data['platform_number'],
-                    "date": float_data['date'],
-                    "parameters": float_data['parameters']
+                    "platform_number": f['platform_number'],
+                    "date": f['date'],
+                    "parameters": f['parameters']
                 }
             }
-            map_data["markers"].append(marker)
-    
-    # If no specific floats in context, show all floats
-    if not map_data["markers"]:
+            for f in (located[i] for i in indices)
+        ]
+    else:
+        # No specific floats in context: cluster every stored position,
+        # reading only the columns the map needs
         from models import ArgoFloat
-        all_floats = db.query(ArgoFloat).all()
-        for float_obj in all_floats:
-            if float_obj.latitude and float_obj.longitude:
-                marker = {
-                    "position": [float_obj.latitude, float_obj.longitude],
-                    "popup": f"Float {float_obj.platform_number}",
-                    "data": {
-                        "platform_number": float_obj.platform_number,
-                        "date": float_obj.juld.isoformat() if float_obj.juld else None,
-                        "parameters": float_obj.parameters
-                    }
-                }
-                map_data["markers"].append(marker)
-    
-    return map_data
\ No newline at end of file
+        rows = db.query(ArgoFloat.id, ArgoFloat.latitude, ArgoFloat.longitude).filter(
+            ArgoFloat.latitude.isnot(None), ArgoFloat.longitude.isnot(None)
+        ).all()
+        lats = [row.latitude for row in rows]
+        lons = [row.longitude for row in rows]
+        markers_for = lambda indices: float_markers(db, [rows[i].id for i in indices])
+
+    map_data = clustered_map_data(lats, lons, markers_for, zoom)
+    if map_data is None:
+        # Default center (Arabian Sea)
+        map_data = {"center": [20, 80], "zoom": zoom, "clusters": [], "markers": []}
+    return map_data
+
+def float_markers(db, float_ids: List[int]) -> List[Dict[str, Any]]:
+    """Marker popup/data of the given floats, loaded with one IN query per batch"""
+    from models import ArgoFloat
+    details = {}
+    for start in range(0, len(float_ids), MARKER_BATCH_SIZE):
+        batch = float_ids[start:start + MARKER_BATCH_SIZE]
+        for row in db.query(ArgoFloat.id, ArgoFloat.platform_number, ArgoFloat.juld, ArgoFloat.parameters).filter(
+            ArgoFloat.id.in_(batch)
+        ):
+            details[row.id] = float_marker(row.platform_number, row.juld, row.parameters, row.id)
+    return [details[float_id] for float_id in float_ids]
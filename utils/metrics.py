@@ -0,0 +1,247 @@
+"""Request and stage instrumentation exposed in Prometheus text format.
+
+MetricsMiddleware times every HTTP request per route template and
+records in-flight counts per method and request/response body sizes.
+stage() times a named step of a hot path (file write, NetCDF parsing, DB
+commit, query building, encoding) into a histogram and into the
+breakdown of the request it runs under. Work done in another process is
+timed with collect_stages() and recorded by the parent through
+record_stage().
+
+When OCEAN_SLOW_REQUEST_MS is set, requests slower than that are logged
+at WARNING on the utils.metrics logger, as one JSON line with their
+stage breakdown and the fields attached by note(), such as the parsed
+query intent and row counts.
+"""
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+SLOW_REQUEST_MS = float(os.getenv("OCEAN_SLOW_REQUEST_MS", "0"))
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000, 100_000_000)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Cumulative histogram with one series per label value tuple"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str], buckets: Sequence[float]):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series: Dict[Tuple[str, ...], List] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            series = [(labels, list(counts), total, count) for labels, (counts, total, count) in self._series.items()]
+        for labels, counts, total, count in sorted(series):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else _number(bound)
+                bucket_labels = _labels(self.labelnames, labels, f'le="{le}"')
+                yield f"{self.name}_bucket{bucket_labels} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}"
+            yield f"{self.name}_count{_labels(self.labelnames, labels)} {count}"
+
+
+class Gauge:
+    """Value that goes up and down, one per label value tuple"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str]):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels: str, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} gauge"
+        with self._lock:
+            values = sorted(self._values.items())
+        for labels, value in values:
+            yield f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}"
+
+
+REQUEST_DURATION = Histogram("ocean_http_request_duration_seconds", "Time to serve an HTTP request",
+                             ("method", "route", "status"), DURATION_BUCKETS)
+REQUESTS_IN_FLIGHT = Gauge("ocean_http_requests_in_flight", "HTTP requests being served", ("method",))
+REQUEST_SIZE = Histogram("ocean_http_request_size_bytes", "Size of HTTP request bodies",
+                         ("method", "route"), SIZE_BUCKETS)
+RESPONSE_SIZE = Histogram("ocean_http_response_size_bytes", "Size of HTTP response bodies",
+                          ("method", "route"), SIZE_BUCKETS)
+STAGE_DURATION = Histogram("ocean_stage_duration_seconds", "Time spent in a stage of a hot path",
+                           ("stage",), DURATION_BUCKETS)
+METRICS = [REQUEST_DURATION, REQUESTS_IN_FLIGHT, REQUEST_SIZE, RESPONSE_SIZE, STAGE_DURATION]
+
+# Stage breakdown and notes of the request being served, if any
+_request: ContextVar[Optional[Dict[str, Any]]] = ContextVar("ocean_request", default=None)
+# Set by collect_stages() while timings are gathered for another process
+_collector: ContextVar[Optional[Dict[str, float]]] = ContextVar("ocean_stage_collector", default=None)
+
+
+def render_metrics() -> str:
+    """All metrics in the Prometheus text exposition format"""
+    return "\n".join(line for metric in METRICS for line in metric.render()) + "\n"
+
+
+def record_stage(name: str, seconds: float):
+    """Record a stage duration measured elsewhere, e.g. in a pool process"""
+    collector = _collector.get()
+    if collector is not None:
+        collector[name] = collector.get(name, 0.0) + seconds
+        return
+    STAGE_DURATION.observe(seconds, name)
+    request = _request.get()
+    if request is not None:
+        request["stages"][name] = request["stages"].get(name, 0.0) + seconds
+
+
+@contextmanager
+def stage(name: str):
+    """Time the enclosed block as a stage"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - started)
+
+
+@contextmanager
+def collect_stages():
+    """Gather stage timings into a dict instead of the histograms.
+
+    For work running in a pool process, whose histograms the app never
+    sees: the dict travels back with the result and the parent records
+    each entry with record_stage().
+    """
+    timings = {}
+    token = _collector.set(timings)
+    try:
+        yield timings
+    finally:
+        _collector.reset(token)
+
+
+def note(**fields: Any):
+    """Attach fields to the slow-request log entry of the current request"""
+    request = _request.get()
+    if request is not None:
+        request["notes"].update(fields)
+
+
+def route_template(scope) -> str:
+    """Path template of the route that served a request, keeping label values bounded.
+
+    The router stores the matched route in the scope, so this is only
+    known once the request has been dispatched.
+    """
+    return getattr(scope.get("route"), "path", None) or "unmatched"
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing requests and measuring their payloads"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        request = {"stages": {}, "notes": {}}
+        received = sent = 0
+        status = 500
+
+        async def receive_body():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+            return message
+
+        async def send_body(message):
+            nonlocal sent, status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                sent += len(message.get("body", b""))
+            await send(message)
+
+        token = _request.set(request)
+        REQUESTS_IN_FLIGHT.inc(method)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive_body, send_body)
+        finally:
+            elapsed = time.perf_counter() - started
+            REQUESTS_IN_FLIGHT.dec(method)
+            _request.reset(token)
+            route = route_template(scope)
+            REQUEST_DURATION.observe(elapsed, method, route, str(status))
+            REQUEST_SIZE.observe(received, method, route)
+            RESPONSE_SIZE.observe(sent, method, route)
+            if SLOW_REQUEST_MS and elapsed * 1000 >= SLOW_REQUEST_MS:
+                _log_slow_request(scope, status, elapsed, request)
+
+
+def _log_slow_request(scope, status: int, elapsed: float, request: Dict[str, Any]):
+    entry = {
+        "method": scope["method"],
+        "path": scope["path"],
+        "query": scope.get("query_string", b"").decode("latin-1"),
+        "status": status,
+        "duration_ms": round(elapsed * 1000, 2),
+        "stages_ms": {name: round(seconds * 1000, 2) for name, seconds in request["stages"].items()},
+        **request["notes"]
+    }
+    logger.warning("Slow request: %s", json.dumps(entry, default=str))
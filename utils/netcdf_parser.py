@@ -1,70 +1,203 @@
 import netCDF4 as nc
 import numpy as np
+from collections.abc import Mapping
 from datetime import datetime, timedelta
-from geoalchemy2.shape import from_shape
-from shapely.geometry import Point
+
+from utils.metrics import stage
+
+PROFILE_PARAMETERS = ['PRES', 'TEMP', 'PSAL']
+
+# Read modes of parse_netcdf_profiles
+FULL = "full"  # Profile arrays read up front
+LAZY = "lazy"  # Profile arrays read from the file on first access
+HEADER = "header"  # Metadata and positions only, no profile_data
 
 def parse_netcdf(file_path):
-    """Parse ARGO NetCDF file and extract relevant data"""
-    data = nc.Dataset(file_path)
-    
-    # Extract metadata
-    platform_number = getattr(data, 'PLATFORM_NUMBER', 'Unknown').strip()
-    date_created = parse_date(getattr(data, 'DATE_CREATION', ''))
-    juld = parse_juld(getattr(data, 'JULD', 0), getattr(data, 'REFERENCE_DATE_TIME', '19500101000000'))
-    
-    # Extract position data
-    latitude = float(data.variables['LATITUDE'][0]) if 'LATITUDE' in data.variables else None
-    longitude = float(data.variables['LONGITUDE'][0]) if 'LONGITUDE' in data.variables else None
-    
-    # Create geometry point
-    location = from_shape(Point(longitude, latitude)) if latitude and longitude else None
-    
-    # Extract profile data
-    profile_data = extract_profile_data(data)
-    
-    # Extract parameters
-    parameters = []
-    if 'STATION_PARAMETERS' in data.variables:
-        params = data.variables['STATION_PARAMETERS'][:]
-        for param in params:
-            param_name = ''.join([x.decode('utf-8') for x in param if x != b' ']).strip()
-            if param_name:
-                parameters.append(param_name)
-    
-    return {
-        'platform_number': platform_number,
-        'date_created': date_created,
-        'juld': juld,
-        'latitude': latitude,
-        'longitude': longitude,
-        'location': location,
-        'parameters': parameters,
-        'profile_data': profile_data,
-        'cycle_number': int(data.variables['CYCLE_NUMBER'][0]) if 'CYCLE_NUMBER' in data.variables else None,
-        'data_mode': getattr(data, 'DATA_MODE', 'Unknown')
-    }
+    """Parse ARGO NetCDF file and extract relevant data of its first profile"""
+    parsed = parse_netcdf_profiles(file_path)[0]
+    parsed['location'] = profile_location(parsed)
+    return parsed
+
+def parse_netcdf_profiles(file_path, mode=FULL):
+    """Parse every profile of an ARGO NetCDF file.
+
+    Multi-profile files (*_prof.nc, geo/day aggregates) hold N_PROF
+    profiles; each variable is read once and sliced per profile, giving
+    one dict per profile in file order. The dataset is closed before
+    returning; LAZY profiles reopen it once when first accessed.
+    """
+    with stage("parse_netcdf"), nc.Dataset(file_path) as data:
+        n_prof = len(data.dimensions['N_PROF']) if 'N_PROF' in data.dimensions else 1
+        if n_prof == 0:
+            raise ValueError("File contains no profiles")
+
+        # Per-profile metadata, falling back to the global attributes of
+        # single-profile files
+        platform_numbers = _strings(data, 'PLATFORM_NUMBER', n_prof)
+        data_modes = _strings(data, 'DATA_MODE', n_prof)
+        date_created = parse_date(_scalar_string(data, 'DATE_CREATION'))
+        julds = _julds(data, n_prof)
+        latitudes = _numbers(data, 'LATITUDE', n_prof)
+        longitudes = _numbers(data, 'LONGITUDE', n_prof)
+        cycle_numbers = _numbers(data, 'CYCLE_NUMBER', n_prof)
+        parameters = _station_parameters(data, n_prof)
+        profiles = None
+        if mode == FULL:
+            with stage("extract_profile_data"):
+                profiles = extract_profiles(data, n_prof)
+
+    if mode == LAZY:
+        source = _ProfileSource(file_path, n_prof)
+        profiles = [LazyProfile(source, i) for i in range(n_prof)]
+
+    results = []
+    for i in range(n_prof):
+        parsed = {
+            'platform_number': platform_numbers[i] or 'Unknown',
+            'date_created': date_created,
+            'juld': julds[i],
+            'latitude': latitudes[i],
+            'longitude': longitudes[i],
+            'parameters': parameters[i],
+            'cycle_number': int(cycle_numbers[i]) if cycle_numbers[i] is not None else None,
+            'data_mode': data_modes[i] or 'Unknown'
+        }
+        if profiles is not None:
+            parsed['profile_data'] = profiles[i]
+        results.append(parsed)
+    return results
+
+def profile_location(parsed):
+    """Geometry point of a parsed profile, built only when asked for"""
+    from geoalchemy2.shape import from_shape
+    from shapely.geometry import Point
+
+    latitude, longitude = parsed['latitude'], parsed['longitude']
+    return from_shape(Point(longitude, latitude)) if latitude and longitude else None
+
+class _ProfileSource:
+    """Reads the profile arrays of a file once, on first request"""
+
+    def __init__(self, file_path, n_prof):
+        self.file_path = file_path
+        self.n_prof = n_prof
+        self._profiles = None
+
+    def profile(self, index):
+        if self._profiles is None:
+            with stage("extract_profile_data"), nc.Dataset(self.file_path) as data:
+                self._profiles = extract_profiles(data, self.n_prof)
+        return self._profiles[index]
+
+class LazyProfile(Mapping):
+    """profile_data of one profile whose arrays are read on first access"""
+
+    def __init__(self, source, index):
+        self._source = source
+        self._index = index
+
+    def __getitem__(self, param):
+        return self._source.profile(self._index)[param]
+
+    def __iter__(self):
+        return iter(self._source.profile(self._index))
+
+    def __len__(self):
+        return len(self._source.profile(self._index))
 
 def extract_profile_data(data):
-    """Extract profile data from NetCDF file"""
-    profile_data = {}
-    
-    # Extract PRES, TEMP, PSAL data if available
-    for param in ['PRES', 'TEMP', 'PSAL']:
-        if param in data.variables:
-            values = data.variables[param][:]
-            # Handle fill values and quality control
-            if '_FillValue' in data.variables[param].ncattrs():
-                fill_value = data.variables[param]._FillValue
-                values = np.ma.masked_equal(values, fill_value)
-            
-            profile_data[param] = {
-                'values': values.compressed().tolist() if hasattr(values, 'compressed') else values.tolist(),
-                'units': getattr(data.variables[param], 'units', ''),
-                'long_name': getattr(data.variables[param], 'long_name', '')
+    """Extract profile data from NetCDF file as float32 arrays"""
+    return extract_profiles(data, 1)[0]
+
+def extract_profiles(data, n_prof):
+    """Extract PRES/TEMP/PSAL of every profile as float32 arrays.
+
+    Each variable is read and masked once as an (N_PROF, N_LEVELS) array.
+    Levels missing in every parameter (the padding of shorter casts) are
+    dropped; a value missing in only some parameters stays NaN, so all
+    parameters of a profile keep the same levels.
+    """
+    arrays = {}
+    for param in PROFILE_PARAMETERS:
+        if param not in data.variables:
+            continue
+        variable = data.variables[param]
+        values = variable[:]
+        # Handle fill values and quality control
+        if '_FillValue' in variable.ncattrs():
+            values = np.ma.masked_equal(values, variable._FillValue)
+        values = np.ma.filled(np.ma.asarray(values, dtype=np.float32), np.nan).reshape(n_prof, -1)
+        arrays[param] = (values, getattr(variable, 'units', ''), getattr(variable, 'long_name', ''))
+
+    profiles = [{} for _ in range(n_prof)]
+    if not arrays:
+        return profiles
+    width = min(values.shape[1] for values, _, _ in arrays.values())
+    present = np.any([~np.isnan(values[:, :width]) for values, _, _ in arrays.values()], axis=0)
+    for param, (values, units, long_name) in arrays.items():
+        for i, row in enumerate(values[:, :width]):
+            profiles[i][param] = {
+                'values': row[present[i]],
+                'units': units,
+                'long_name': long_name
             }
-    
-    return profile_data
+    return profiles
+
+def _strings(data, name, n_prof):
+    """Per-profile strings of a char variable, or the global attribute for all"""
+    if name in data.variables:
+        raw = np.ma.getdata(data.variables[name][:])
+        if raw.dtype.kind == 'S' and raw.dtype.itemsize == 1 and raw.ndim == 1 and raw.size == n_prof:
+            # One character per profile, e.g. DATA_MODE
+            strings = [c.decode('utf-8', 'ignore') for c in raw]
+        elif raw.dtype.kind == 'S' and raw.dtype.itemsize == 1:
+            strings = list(np.atleast_1d(nc.chartostring(raw)))
+        else:
+            strings = [s.decode('utf-8', 'ignore') if isinstance(s, bytes) else str(s) for s in np.atleast_1d(raw)]
+        if len(strings) == n_prof:
+            return [s.strip() for s in strings]
+    return [str(getattr(data, name, '')).strip()] * n_prof
+
+def _scalar_string(data, name):
+    if name in data.variables:
+        raw = np.ma.getdata(data.variables[name][:])
+        if raw.dtype.kind == 'S' and raw.dtype.itemsize == 1:
+            return str(nc.chartostring(raw)).strip()
+        return str(raw).strip()
+    return getattr(data, name, '')
+
+def _numbers(data, name, n_prof):
+    """Per-profile values of a numeric (N_PROF,) variable, None where missing"""
+    if name not in data.variables:
+        return [None] * n_prof
+    values = np.ma.filled(np.ma.asarray(data.variables[name][:], dtype=np.float64), np.nan).ravel()[:n_prof]
+    return [None if np.isnan(v) else float(v) for v in values] + [None] * (n_prof - len(values))
+
+def _julds(data, n_prof):
+    """Per-profile dates from the JULD variable, or the global JULD attribute"""
+    reference = _scalar_string(data, 'REFERENCE_DATE_TIME') or '19500101000000'
+    if 'JULD' not in data.variables:
+        return [parse_juld(getattr(data, 'JULD', 0), reference)] * n_prof
+    try:
+        ref_date = np.datetime64(datetime.strptime(reference, '%Y%m%d%H%M%S'), 'us')
+    except ValueError:
+        return [None] * n_prof
+    days = np.ma.filled(np.ma.asarray(data.variables['JULD'][:], dtype=np.float64), np.nan).ravel()[:n_prof]
+    valid = ~np.isnan(days)
+    dates = ref_date + np.round(np.where(valid, days, 0) * 86_400_000_000).astype('timedelta64[us]')
+    return [d.item() if ok else None for d, ok in zip(dates, valid)]
+
+def _station_parameters(data, n_prof):
+    """Parameter names per profile from a 2-D or (N_PROF, N_PARAM, ...) STATION_PARAMETERS"""
+    if 'STATION_PARAMETERS' not in data.variables:
+        return [[] for _ in range(n_prof)]
+    raw = np.ma.getdata(data.variables['STATION_PARAMETERS'][:])
+    names = nc.chartostring(raw) if raw.dtype.kind == 'S' and raw.dtype.itemsize == 1 else raw
+    names = np.asarray(names, dtype=str)
+    if names.ndim == 1:
+        shared = [name.strip() for name in names if name.strip()]
+        return [list(shared) for _ in range(n_prof)]
+    return [[name.strip() for name in row if name.strip()] for row in names.reshape(n_prof, -1)]
 
 def parse_date(date_str):
     """Parse date string from NetCDF attributes"""
@@ -79,4 +212,4 @@ def parse_juld(juld, reference_date):
         ref_date = datetime.strptime(reference_date, '%Y%m%d%H%M%S')
         return ref_date + timedelta(days=float(juld))
     except:
-        return None
\ No newline at end of file
+        return None
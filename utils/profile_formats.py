@@ -0,0 +1,176 @@
+"""Content negotiation for profile responses.
+
+Profiles can be served as JSON (through orjson when installed), as an
+Apache Arrow IPC stream or as MessagePack. The binary formats carry the
+stored float32 arrays as-is instead of lists of Python floats. pyarrow,
+msgpack and orjson are optional; asking for a format whose library is
+missing is answered with 406.
+"""
+import json
+from typing import Any, Dict, Optional
+
+import numpy as np
+from fastapi import HTTPException, Request, Response
+
+from utils.metrics import stage
+from utils.profile_store import PROFILE_DTYPE, values_to_list
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+MEDIA_TYPES = {
+    "json": "application/json",
+    "arrow": "application/vnd.apache.arrow.stream",
+    "msgpack": "application/msgpack"
+}
+_FORMATS_BY_MEDIA_TYPE = {
+    "application/json": "json",
+    "application/vnd.apache.arrow.stream": "arrow",
+    "application/x-msgpack": "msgpack",
+    "application/msgpack": "msgpack"
+}
+
+
+def negotiate_format(request: Request, format: Optional[str] = None) -> str:
+    """Pick a response format from ?format= or the Accept header.
+
+    Accept entries are tried by decreasing q value; JSON is the default
+    when the header is absent or accepts anything.
+    """
+    if format:
+        if format not in MEDIA_TYPES:
+            raise HTTPException(status_code=400, detail=f"Unknown format, expected one of: {', '.join(MEDIA_TYPES)}")
+        missing = _missing_package(format)
+        if missing:
+            raise HTTPException(status_code=406, detail=f"{format} responses require the {missing} package")
+        return format
+
+    accept = request.headers.get("accept")
+    if not accept:
+        return "json"
+    entries = []
+    for position, item in enumerate(accept.split(",")):
+        media_type, *params = [part.strip() for part in item.split(";")]
+        q = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        if q > 0:
+            entries.append((-q, position, media_type.lower()))
+
+    for _, _, media_type in sorted(entries):
+        if media_type in ("*/*", "application/*"):
+            return "json"
+        fmt = _FORMATS_BY_MEDIA_TYPE.get(media_type)
+        if fmt and not _missing_package(fmt):
+            return fmt
+    raise HTTPException(status_code=406, detail=f"Supported media types: {', '.join(MEDIA_TYPES.values())}")
+
+
+def _missing_package(fmt: str) -> Optional[str]:
+    """Name of the optional package a format needs when it is not installed"""
+    if fmt == "arrow" and pyarrow is None:
+        return "pyarrow"
+    if fmt == "msgpack" and msgpack is None:
+        return "msgpack"
+    return None
+
+
+def encode_json(content: Any) -> bytes:
+    """Serialize a response body, passing NumPy arrays straight to orjson"""
+    with stage("encode_json"):
+        if orjson is not None:
+            return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY)
+        return json.dumps(content, default=_list_arrays, separators=(",", ":")).encode("utf-8")
+
+
+def _list_arrays(value):
+    if isinstance(value, np.ndarray):
+        return values_to_list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def json_profile(profile: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Profile whose arrays encode_json can serialize without copying to lists"""
+    return {name: dict(param, values=np.ascontiguousarray(param['values'])) for name, param in profile.items()}
+
+
+def encode_arrow(platform_number: str, profile: Dict[str, Dict[str, Any]]) -> bytes:
+    """One record batch with a float32 column per parameter.
+
+    Shorter parameters are padded with nulls; units and long names are
+    stored as field metadata and the platform as schema metadata.
+    """
+    length = max((len(param['values']) for param in profile.values()), default=0)
+    fields = []
+    columns = []
+    for name, param in profile.items():
+        values = np.asarray(param['values'], dtype=PROFILE_DTYPE)
+        mask = np.arange(length) >= len(values)
+        padded = np.zeros(length, dtype=PROFILE_DTYPE)
+        padded[:len(values)] = values
+        columns.append(pyarrow.array(padded, type=pyarrow.float32(), mask=mask if mask.any() else None))
+        fields.append(pyarrow.field(name, pyarrow.float32(), metadata={
+            "units": param.get('units', ''), "long_name": param.get('long_name', '')
+        }))
+    schema = pyarrow.schema(fields, metadata={"platform_number": platform_number})
+    batch = pyarrow.record_batch(columns, schema=schema)
+    sink = pyarrow.BufferOutputStream()
+    with pyarrow.ipc.new_stream(sink, schema) as writer:
+        writer.write_batch(batch)
+    return sink.getvalue().to_pybytes()
+
+
+def encode_msgpack(platform_number: str, profile: Dict[str, Dict[str, Any]]) -> bytes:
+    """Map of parameters whose values are little-endian float32 bytes"""
+    return msgpack.packb({
+        "platform_number": platform_number,
+        "dtype": PROFILE_DTYPE.str,
+        "profile_data": {
+            name: {
+                "values": np.asarray(param['values'], dtype=PROFILE_DTYPE).tobytes(),
+                "units": param.get('units', ''),
+                "long_name": param.get('long_name', '')
+            }
+            for name, param in profile.items()
+        }
+    })
+
+
+def profile_response(fmt: str, platform_number: str, profile: Dict[str, Dict[str, Any]],
+                     field: str = "profile_data", param: Optional[str] = None) -> Response:
+    """Serve a loaded profile, or a single parameter of it, in the negotiated format.
+
+    JSON keeps the existing shape: {"platform_number", field: profile} or,
+    with param, {"platform_number", field: profile[param]}.
+    """
+    if param is not None:
+        profile = {param: profile[param]}
+    if fmt == "arrow":
+        with stage("encode_arrow"):
+            content = encode_arrow(platform_number, profile)
+    elif fmt == "msgpack":
+        with stage("encode_msgpack"):
+            content = encode_msgpack(platform_number, profile)
+    else:
+        arrays = json_profile(profile)
+        content = encode_json({
+            "platform_number": platform_number,
+            field: arrays[param] if param is not None else arrays
+        })
+    return Response(content=content, media_type=MEDIA_TYPES[fmt], headers={"Vary": "Accept"})
@@ -0,0 +1,133 @@
+"""Level-of-detail reduction of profiles for visualization.
+
+A profile can be thinned to a point budget with Largest-Triangle-Three-
+Buckets (LTTB), which keeps the levels that carry the visible shape, or
+interpolated onto a fixed set of pressure levels. LTTB runs on all
+parameters at once, so every parameter keeps the same levels and stays
+paired with PRES. The selections for LOD_TIERS are computed at ingest
+and stored in the profile blob; other budgets are computed on request.
+"""
+import os
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from utils.climatology import STANDARD_LEVELS
+from utils.profile_math import interpolate_levels, pad_profiles, sorted_profile
+from utils.profile_store import PROFILE_DTYPE, decode_tiers
+
+LOD_TIERS = [int(points) for points in os.getenv("OCEAN_LOD_TIERS", "100,250,500").split(",")]
+
+Profile = Dict[str, Dict[str, Any]]
+
+
+def lttb_indices(x: np.ndarray, ys: np.ndarray, points: int) -> np.ndarray:
+    """Indices of the points kept by LTTB over series ys (rows) sharing x.
+
+    Each series is scaled to [0, 1] first so the triangle areas of all
+    of them weigh equally; the first and last points are always kept.
+    """
+    length = len(x)
+    if points >= length:
+        return np.arange(length)
+    if points < 3:
+        return np.array([0, length - 1])[:max(points, 1)]
+
+    x = _normalized(np.asarray(x, dtype=np.float64)[None, :])[0]
+    ys = _normalized(np.atleast_2d(np.asarray(ys, dtype=np.float64)))
+
+    selected = np.empty(points, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = length - 1
+    every = (length - 2) / (points - 2)
+    a = 0
+    for i in range(points - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, length)
+        # Average of the next bucket, the third corner of every triangle
+        avg_x = x[end:next_end].mean()
+        avg_y = ys[:, end:next_end].mean(axis=1)[:, None]
+        ax, ay = x[a], ys[:, a][:, None]
+        areas = np.abs((ax - avg_x) * (ys[:, start:end] - ay) - (ax - x[start:end]) * (avg_y - ay))
+        a = start + int(np.argmax(areas.sum(axis=0)))
+        selected[i + 1] = a
+    return selected
+
+
+def _normalized(rows: np.ndarray) -> np.ndarray:
+    """Scale each row to [0, 1], with missing values at 0"""
+    with np.errstate(invalid="ignore"):
+        low = np.nanmin(np.where(np.isfinite(rows), rows, np.nan), axis=1, keepdims=True)
+        high = np.nanmax(np.where(np.isfinite(rows), rows, np.nan), axis=1, keepdims=True)
+    span = np.where(high > low, high - low, 1.0)
+    return np.nan_to_num((rows - np.nan_to_num(low)) / span, nan=0.0, posinf=0.0, neginf=0.0)
+
+
+def profile_indices(profile: Profile, points: int) -> np.ndarray:
+    """LTTB selection of a whole profile, using PRES as x when present"""
+    length = min(len(param['values']) for param in profile.values())
+    shape = [param['values'][:length] for name, param in profile.items() if name != 'PRES']
+    x = profile['PRES']['values'][:length] if 'PRES' in profile else np.arange(length)
+    return lttb_indices(x, np.array(shape) if shape else x[None, :], points)
+
+
+def profile_tiers(profile: Profile) -> Dict[int, np.ndarray]:
+    """Selections for every LOD tier smaller than the profile"""
+    if not profile:
+        return {}
+    length = max(len(param['values']) for param in profile.values())
+    return {points: profile_indices(profile, points) for points in LOD_TIERS if points < length}
+
+
+def downsample_profile(profile: Profile, max_points: int,
+                       tiers: Optional[Dict[int, np.ndarray]] = None) -> Profile:
+    """Keep at most max_points levels, reusing the largest fitting precomputed tier"""
+    length = max((len(param['values']) for param in profile.values()), default=0)
+    if length <= max_points:
+        return profile
+    fitting = [points for points in (tiers or {}) if points <= max_points]
+    indices = tiers[max(fitting)] if fitting else profile_indices(profile, max_points)
+    return {
+        name: dict(param, values=param['values'][indices[indices < len(param['values'])]])
+        for name, param in profile.items()
+    }
+
+
+def parse_levels(value: str) -> List[float]:
+    """Parse levels= as "standard" or comma separated pressures in dbar"""
+    if value == "standard":
+        return [float(level) for level in STANDARD_LEVELS]
+    message = "levels must be 'standard' or non-negative pressures separated by commas"
+    try:
+        levels = sorted(float(level) for level in value.split(","))
+    except ValueError:
+        raise ValueError(message)
+    if levels[0] < 0:
+        raise ValueError(message)
+    return levels
+
+
+def profile_at_levels(profile: Profile, levels: List[float]) -> Profile:
+    """Interpolate every parameter onto the given pressures; NaN outside the profile"""
+    if 'PRES' not in profile:
+        raise ValueError("Profile has no pressure levels to interpolate on")
+    pres = profile['PRES']['values']
+    result = {'PRES': dict(profile['PRES'], values=np.asarray(levels, dtype=PROFILE_DTYPE))}
+    for name, param in profile.items():
+        if name == 'PRES':
+            continue
+        P, V = pad_profiles([sorted_profile(pres, param['values'])])
+        result[name] = dict(param, values=interpolate_levels(P, V, levels)[0].astype(PROFILE_DTYPE))
+    return result
+
+
+def apply_lod(argo_float, profile: Profile, max_points: Optional[int] = None,
+              levels: Optional[str] = None) -> Profile:
+    """Reduce a loaded profile as requested by the max_points= / levels= options"""
+    if levels:
+        return profile_at_levels(profile, parse_levels(levels))
+    if max_points:
+        tiers = decode_tiers(argo_float.profile_blob) if argo_float.profile_blob else None
+        return downsample_profile(profile, max_points, tiers)
+    return profile
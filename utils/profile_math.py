@@ -0,0 +1,155 @@
+import threading
+from collections import OrderedDict
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from utils.profile_store import load_profile
+
+# Depths in the questions are in metres; ARGO profiles are indexed by
+# pressure in dbar. Near the surface 1 dbar is about 1 m, which is the
+# approximation used throughout.
+
+INTERPOLANT_CACHE_SIZE = 4096
+STACK_CACHE_SIZE = 32
+
+
+def sorted_profile(pres: np.ndarray, values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Drop missing levels and sort a profile by increasing pressure"""
+    n = min(len(pres), len(values))
+    pres = np.asarray(pres[:n], dtype=np.float64)
+    values = np.asarray(values[:n], dtype=np.float64)
+    valid = np.isfinite(pres) & np.isfinite(values)
+    pres, values = pres[valid], values[valid]
+    order = np.argsort(pres, kind="stable")
+    return pres[order], values[order]
+
+
+def pad_profiles(profiles: Sequence[Tuple[np.ndarray, np.ndarray]]) -> Tuple[np.ndarray, np.ndarray]:
+    """Stack sorted (pres, values) profiles into NaN-padded 2-D arrays"""
+    width = max((len(pres) for pres, _ in profiles), default=0)
+    P = np.full((len(profiles), width), np.nan)
+    V = np.full((len(profiles), width), np.nan)
+    for row, (pres, values) in enumerate(profiles):
+        P[row, :len(pres)] = pres
+        V[row, :len(values)] = values
+    return P, V
+
+
+def interpolate_levels(P: np.ndarray, V: np.ndarray, targets: Iterable[float]) -> np.ndarray:
+    """Linearly interpolate every row of a padded stack at the target pressures.
+
+    Rows must be sorted by pressure with NaN padding at the end, as built
+    by pad_profiles. Returns an array of shape (rows, targets); targets
+    outside a row's pressure range are NaN.
+    """
+    targets = np.atleast_1d(np.asarray(targets, dtype=np.float64))
+    rows = P.shape[0]
+    if rows == 0 or P.shape[1] == 0:
+        return np.full((rows, len(targets)), np.nan)
+
+    counts = np.sum(~np.isnan(P), axis=1)
+    searchable = np.where(np.isnan(P), np.inf, P)
+    # Number of levels strictly shallower than each target: (rows, targets)
+    above = np.sum(searchable[:, :, None] < targets[None, None, :], axis=1)
+
+    last = np.maximum(counts - 1, 0)[:, None]
+    upper = np.minimum(above, last)
+    lower = np.maximum(upper - 1, 0)
+    # An exact hit on the shallowest level interpolates onto itself
+    lower = np.where(above == 0, upper, lower)
+
+    row_index = np.arange(rows)[:, None]
+    p0, p1 = P[row_index, lower], P[row_index, upper]
+    v0, v1 = V[row_index, lower], V[row_index, upper]
+    span = p1 - p0
+    with np.errstate(invalid="ignore", divide="ignore"):
+        weight = np.where(span > 0, (targets[None, :] - p0) / span, 0.0)
+    result = v0 + weight * (v1 - v0)
+
+    outside = (counts[:, None] == 0) | (targets[None, :] < p0) | (targets[None, :] > P[row_index, last])
+    result[outside] = np.nan
+    return result
+
+
+def first_valid(V: np.ndarray) -> np.ndarray:
+    """Shallowest value of each padded row (the surface value)"""
+    if V.shape[1] == 0:
+        return np.full(V.shape[0], np.nan)
+    return V[:, 0]
+
+
+def deepest_pressure(P: np.ndarray) -> np.ndarray:
+    """Deepest pressure reached by each padded row"""
+    if P.shape[1] == 0:
+        return np.full(P.shape[0], np.nan)
+    counts = np.sum(~np.isnan(P), axis=1)
+    return P[np.arange(P.shape[0]), np.maximum(counts - 1, 0)]
+
+
+class InterpolantCache:
+    """LRU caches of sorted per-float profiles and padded result-set stacks.
+
+    Entries are keyed by (float id, date_updated), so a re-ingested float
+    is never served from a stale entry.
+    """
+
+    def __init__(self, maxsize: int = INTERPOLANT_CACHE_SIZE, stack_maxsize: int = STACK_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.stack_maxsize = stack_maxsize
+        self._profiles = OrderedDict()
+        self._stacks = OrderedDict()
+        self._lock = threading.Lock()
+
+    def stack(self, floats: List, param: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Padded (P, V) arrays of param for the given ArgoFloat rows"""
+        key = (param, tuple((f.id, f.date_updated) for f in floats))
+        with self._lock:
+            stacked = self._stacks.get(key)
+            if stacked is not None:
+                self._stacks.move_to_end(key)
+                return stacked
+
+        stacked = pad_profiles([self.profile(f, param) for f in floats])
+        with self._lock:
+            self._stacks[key] = stacked
+            while len(self._stacks) > self.stack_maxsize:
+                self._stacks.popitem(last=False)
+        return stacked
+
+    def profile(self, argo_float, param: str) -> Tuple[np.ndarray, np.ndarray]:
+        key = (argo_float.id, argo_float.date_updated, param)
+        with self._lock:
+            cached = self._profiles.get(key)
+            if cached is not None:
+                self._profiles.move_to_end(key)
+                return cached
+
+        profile = load_profile(argo_float)
+        empty = np.empty(0)
+        if 'PRES' in profile and param in profile:
+            cached = sorted_profile(profile['PRES']['values'], profile[param]['values'])
+        else:
+            cached = (empty, empty)
+        with self._lock:
+            self._profiles[key] = cached
+            while len(self._profiles) > self.maxsize:
+                self._profiles.popitem(last=False)
+        return cached
+
+
+interpolant_cache = InterpolantCache()
+
+
+def values_at_depth(floats: List, param: str, depth: Optional[float]) -> np.ndarray:
+    """param of every float at depth (dbar), or at the surface when depth is None"""
+    P, V = interpolant_cache.stack(floats, param)
+    if depth is None:
+        return first_valid(V)
+    return interpolate_levels(P, V, [depth])[:, 0]
+
+
+def to_chart_values(values: np.ndarray, decimals: int = 3) -> List[Optional[float]]:
+    """NaN-safe list of rounded values for chart payloads"""
+    rounded = np.round(values.astype(np.float64), decimals)
+    return [None if np.isnan(v) else float(v) for v in rounded]
@@ -0,0 +1,135 @@
+import json
+import struct
+from typing import Dict, Any, Optional
+
+import numpy as np
+
+# Blob layout (all integers little-endian):
+#   magic "ARGP" | uint16 format version | uint32 header length | JSON header
+#   | zero padding to a 4-byte boundary | float32 arrays back to back
+#   | uint32 LOD tier index arrays back to back (version 2)
+# The JSON header lists each parameter with its units, long name, element
+# count and byte offset into the array section. Version 2 adds "tiers":
+# the level indices kept by each precomputed level-of-detail tier, with
+# offsets into the same section. Version 1 blobs have no tiers.
+PROFILE_MAGIC = b"ARGP"
+PROFILE_FORMAT_VERSION = 2
+PROFILE_DTYPE = np.dtype("<f4")
+TIER_DTYPE = np.dtype("<u4")
+
+_PREFIX = struct.Struct("<4sHI")
+
+
+def encode_profile(profile_data: Dict[str, Dict[str, Any]],
+                   tiers: Optional[Dict[int, np.ndarray]] = None) -> Optional[bytes]:
+    """Pack {param: {'values', 'units', 'long_name'}} into a profile blob.
+
+    tiers maps a point budget to the level indices kept at that budget.
+    """
+    if not profile_data:
+        return None
+
+    params = []
+    arrays = []
+    offset = 0
+    for name, param in profile_data.items():
+        values = np.ascontiguousarray(param['values'], dtype=PROFILE_DTYPE).ravel()
+        params.append({
+            "name": name,
+            "units": param.get('units', ''),
+            "long_name": param.get('long_name', ''),
+            "length": int(values.size),
+            "offset": offset
+        })
+        arrays.append(values.tobytes())
+        offset += values.nbytes
+
+    tier_entries = []
+    for points, indices in sorted((tiers or {}).items()):
+        indices = np.ascontiguousarray(indices, dtype=TIER_DTYPE).ravel()
+        tier_entries.append({"points": int(points), "length": int(indices.size), "offset": offset})
+        arrays.append(indices.tobytes())
+        offset += indices.nbytes
+
+    header = json.dumps({"params": params, "tiers": tier_entries}, separators=(",", ":")).encode("utf-8")
+    padding = -(_PREFIX.size + len(header)) % PROFILE_DTYPE.itemsize
+    return b"".join([
+        _PREFIX.pack(PROFILE_MAGIC, PROFILE_FORMAT_VERSION, len(header)),
+        header,
+        b"\0" * padding,
+        *arrays
+    ])
+
+
+def _read_header(blob: bytes):
+    magic, version, header_len = _PREFIX.unpack_from(blob, 0)
+    if magic != PROFILE_MAGIC:
+        raise ValueError("Not a profile blob")
+    if version > PROFILE_FORMAT_VERSION:
+        raise ValueError(f"Unsupported profile format version {version}")
+
+    header_end = _PREFIX.size + header_len
+    header = json.loads(bytes(blob[_PREFIX.size:header_end]))
+    return header, header_end + (-header_end % PROFILE_DTYPE.itemsize)
+
+
+def decode_profile(blob: bytes) -> Dict[str, Dict[str, Any]]:
+    """Unpack a profile blob; values are read-only float32 views of the blob"""
+    header, data_start = _read_header(blob)
+
+    profile = {}
+    for param in header["params"]:
+        profile[param["name"]] = {
+            "values": np.frombuffer(blob, dtype=PROFILE_DTYPE, count=param["length"],
+                                    offset=data_start + param["offset"]),
+            "units": param["units"],
+            "long_name": param["long_name"]
+        }
+    return profile
+
+
+def decode_tiers(blob: bytes) -> Dict[int, np.ndarray]:
+    """Level indices of the precomputed LOD tiers, keyed by point budget"""
+    header, data_start = _read_header(blob)
+    return {
+        tier["points"]: np.frombuffer(blob, dtype=TIER_DTYPE, count=tier["length"],
+                                      offset=data_start + tier["offset"])
+        for tier in header.get("tiers", [])
+    }
+
+
+def load_profile(argo_float) -> Dict[str, Dict[str, Any]]:
+    """Return a float's profile as NumPy arrays.
+
+    Reads the binary blob when present and falls back to the legacy JSON
+    lists in profile_data for rows written before the blob column existed.
+    """
+    if argo_float.profile_blob:
+        return decode_profile(argo_float.profile_blob)
+    if not argo_float.profile_data:
+        return {}
+    return {
+        name: dict(param, values=np.asarray(param.get('values', []), dtype=PROFILE_DTYPE))
+        for name, param in argo_float.profile_data.items()
+    }
+
+
+def values_to_list(values: np.ndarray) -> list:
+    """Convert float32 values to Python floats without float64 noise digits"""
+    # Round-tripping through the shortest float32 repr keeps 45.714287
+    # from turning into 45.71428680419922 in the JSON output
+    listed = values.astype(str).astype(np.float64)
+    missing = np.isnan(listed)
+    if missing.any():
+        # Missing levels are null, as orjson writes them
+        listed = listed.astype(object)
+        listed[missing] = None
+    return listed.tolist()
+
+
+def profile_to_json(profile: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Convert a loaded profile back to the JSON shape served by the API"""
+    return {
+        name: dict(param, values=values_to_list(param['values']))
+        for name, param in profile.items()
+    }
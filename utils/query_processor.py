@@ -1,136 +1,98 @@
-import re
 from datetime import datetime, timedelta
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple
 import json
 
+from .intent_parser import MONTHS, PARAM_KEYWORDS, REGION_KEYWORDS, parse_question
+from .metrics import note, stage
+
+
+def _month_of(text: str) -> Optional[Tuple[int, int]]:
+    """(year, month) of a "march 2024" range bound, or None"""
+    name, year = text.split()
+    return (int(year), MONTHS.index(name) + 1) if name in MONTHS else None
+
+
+def _date_bounds(date_info: Dict[str, Any]) -> Tuple[Optional[datetime], Optional[datetime]]:
+    """[start, end) juld bounds of the parsed date slots; a range covers both end months"""
+    from utils.float_query import month_range, time_range
+
+    date_range = date_info.get('range')
+    first = date_range and _month_of(date_range['start'])
+    last = date_range and _month_of(date_range['end'])
+    if first and last:
+        first, last = sorted((first, last))
+        return time_range(start=month_range(*first)[0], end=month_range(*last)[1])
+    if 'year' in date_info:
+        month = MONTHS.index(date_info['month']) + 1 if 'month' in date_info else None
+        return time_range(date_info['year'], month)
+    return None, None
+
+
+def _period_text(date_info: Dict[str, Any]) -> str:
+    date_range = date_info.get('range')
+    if date_range and _month_of(date_range['start']) and _month_of(date_range['end']):
+        return f" from {date_range['start'].title()} to {date_range['end'].title()}"
+    if 'year' in date_info:
+        return f" from {date_info['year']}"
+    return ""
+
+
 class ArgoQueryProcessor:
     def __init__(self, db_session):
         self.db = db_session
-        self.param_keywords = {
-            'temperature': 'TEMP', 'temp': 'TEMP', 'thermal': 'TEMP',
-            'salinity': 'PSAL', 'salt': 'PSAL', 'saline': 'PSAL',
-            'pressure': 'PRES', 'depth': 'PRES', 'pres': 'PRES', 'deep': 'PRES'
-        }
-        self.region_keywords = {
-            'arabian': 'Arabian Sea', 'arabian sea': 'Arabian Sea',
-            'bengal': 'Bay of Bengal', 'bay of bengal': 'Bay of Bengal',
-            'indian': 'Indian Ocean', 'indian ocean': 'Indian Ocean'
-        }
+        self.param_keywords = PARAM_KEYWORDS
+        self.region_keywords = REGION_KEYWORDS
 
     def process_query(self, question: str) -> Dict[str, Any]:
         """Process a natural language query about ARGO data"""
-        question_lower = question.lower()
-        
-        # Check for greeting
-        if any(word in question_lower for word in ['hello', 'hi', 'hey', 'greetings']):
+        return self.answer(self.parse_intent(question))
+
+    def parse_intent(self, question: str) -> Dict[str, Any]:
+        """Parse a question into its query kind and slots, without touching the database"""
+        with stage("query_parse"):
+            intent = parse_question(question)
+        intent["question"] = question
+        note(intent={key: value for key, value in intent.items() if key != "question"})
+        return intent
+
+    def answer(self, intent: Dict[str, Any]) -> Dict[str, Any]:
+        """Build the response for a parsed intent"""
+        kind = intent["kind"]
+        if kind == "greeting":
             return self._generate_greeting_response()
-        
-        # Check for help request
-        if any(word in question_lower for word in ['help', 'what can you do', 'capabilities']):
+        if kind == "help":
             return self._generate_help_response()
         
-        # Extract date information
-        date_info = self._extract_date_info(question)
-        
-        # Extract parameters
-        parameters = self._extract_parameters(question)
-        
-        # Extract region
-        region = self._extract_region(question)
-        
-        # Extract depth information
-        depth = self._extract_depth(question)
-        
-        # Determine query type and process
-        if any(word in question_lower for word in ['show', 'display', 'find', 'get', 'what is']):
-            return self._process_data_query(question, date_info, parameters, region, depth)
-        elif any(word in question_lower for word in ['compare', 'difference', 'versus', 'vs']):
-            return self._process_comparison_query(question, date_info, parameters, region, depth)
-        elif any(word in question_lower for word in ['list', 'all floats', 'available']):
+        slots = (intent["question"], intent["date_info"], intent["parameters"], intent["region"], intent["depth"])
+        if kind == "data":
+            return self._process_data_query(*slots)
+        elif kind == "comparison":
+            return self._process_comparison_query(*slots, intent["regions"])
+        elif kind == "listing":
             return self._process_listing_query()
         else:
             return self._generate_default_response()
 
-    def _extract_date_info(self, question: str) -> Dict[str, Any]:
-        """Extract date information from the question"""
-        date_info = {}
-        
-        # Extract specific months
-        month_pattern = r'\b(january|february|march|april|may|june|july|august|september|october|november|december)\s+(\d{4})\b'
-        month_matches = re.findall(month_pattern, question.lower())
-        if month_matches:
-            month, year = month_matches[0]
-            date_info['month'] = month
-            date_info['year'] = int(year)
-        
-        # Extract year only
-        year_pattern = r'\b(202[4-5])\b'
-        year_matches = re.findall(year_pattern, question)
-        if year_matches and 'year' not in date_info:
-            date_info['year'] = int(year_matches[0])
-        
-        # Extract date ranges
-        range_pattern = r'\b(from|between)\s+(\w+\s+\d{4})\s+(to|and)\s+(\w+\s+\d{4})\b'
-        range_matches = re.findall(range_pattern, question.lower())
-        if range_matches:
-            date_info['range'] = {
-                'start': range_matches[0][1],
-                'end': range_matches[0][3]
-            }
-        
-        return date_info
-
-    def _extract_parameters(self, question: str) -> List[str]:
-        """Extract parameters from the question"""
-        parameters = []
-        question_lower = question.lower()
-        
-        for keyword, param in self.param_keywords.items():
-            if keyword in question_lower:
-                parameters.append(param)
-        
-        return list(set(parameters))  # Remove duplicates
-
-    def _extract_region(self, question: str) -> Optional[str]:
-        """Extract region from the question"""
-        question_lower = question.lower()
-        
-        for keyword, region in self.region_keywords.items():
-            if keyword in question_lower:
-                return region
-        
-        return None
-
-    def _extract_depth(self, question: str) -> Optional[int]:
-        """Extract depth information from the question"""
-        depth_pattern = r'\b(\d+)\s*(m|meters?|depth)\b'
-        depth_matches = re.findall(depth_pattern, question.lower())
-        
-        if depth_matches:
-            return int(depth_matches[0][0])
-        
-        return None
-
     def _process_data_query(self, question, date_info, parameters, region, depth):
         """Process data retrieval queries"""
         from models import ArgoFloat
+        from utils.float_query import apply_time_range
+        from utils.spatial import region_condition
         
         # Build query
         query = self.db.query(ArgoFloat)
         
-        # Apply date filters
-        if 'year' in date_info:
-            year = date_info['year']
-            query = query.filter(ArgoFloat.juld >= datetime(year, 1, 1))
-            query = query.filter(ArgoFloat.juld < datetime(year + 1, 1, 1))
+        # Apply date filters as indexed juld ranges
+        query = apply_time_range(query, *_date_bounds(date_info))
         
-        # Apply region filter
+        # Apply region filter through the spatial index
         if region:
-            # This would require storing region in database or calculating from coordinates
-            pass
+            query = query.filter(region_condition(self.db, region))
         
         # Get results
-        results = query.all()
+        with stage("query_db"):
+            results = query.all()
+        note(rows=len(results))
         
         if not results:
             return {
@@ -144,25 +106,25 @@ class ArgoQueryProcessor:
             param_text = ", ".join(parameters)
             response = f"I found {len(results)} ARGO floats with {param_text} data"
             
-            if 'year' in date_info:
-                response += f" from {date_info['year']}"
+            response += _period_text(date_info)
             if region:
                 response += f" in the {region}"
             
             response += ". Here are the details:"
         else:
             response = f"I found {len(results)} ARGO floats"
-            if 'year' in date_info:
-                response += f" from {date_info['year']}"
+            response += _period_text(date_info)
             if region:
                 response += f" in the {region}"
             response += ". What specific data would you like to see?"
         
         # Prepare map data
-        map_data = self._generate_map_data(results)
+        with stage("query_map"):
+            map_data = self._generate_map_data(results)
         
         # Prepare visualizations
-        visualizations = self._prepare_visualizations(results, parameters, depth)
+        with stage("query_viz"):
+            visualizations = self._prepare_visualizations(results, parameters, depth)
         
         return {
             "response": response,
@@ -170,37 +132,79 @@ class ArgoQueryProcessor:
             "visualizations": visualizations
         }
 
-    def _process_comparison_query(self, question, date_info, parameters, region, depth):
-        """Process comparison queries"""
-        # This would implement comparison logic between different floats or time periods
+    def _process_comparison_query(self, question, date_info, parameters, region, depth, regions):
+        """Process comparison queries from the precomputed climatology cubes"""
+        from utils.climatology import CLIMATOLOGY_PARAMETERS, nearest_level, regional_stats
+        
+        if len(regions) < 2:
+            return {
+                "response": "I can help you compare ARGO float data. Please specify what you'd like to compare (e.g., 'Compare temperature between Arabian Sea and Bay of Bengal in 2024').",
+                "map_data": None,
+                "visualizations": None
+            }
+        
+        params = [p for p in parameters if p in CLIMATOLOGY_PARAMETERS] or ['TEMP']
+        year = date_info.get('year')
+        month = MONTHS.index(date_info['month']) + 1 if 'month' in date_info else None
+        level = nearest_level(depth)
+        units = {'TEMP': '°C', 'PSAL': 'PSU'}
+        names = {'TEMP': 'temperature', 'PSAL': 'salinity'}
+        
+        period = ""
+        if year:
+            period = f" in {date_info['month'].capitalize()} {year}" if month else f" in {year}"
+        level_text = f"at {level} dbar" if depth is not None else "near the surface"
+        
+        sentences = []
+        visualizations = {}
+        for param in params:
+            with stage("query_db"):
+                stats = {name: regional_stats(self.db, name, param, level, year, month) for name in regions}
+            parts = [
+                f"{s['mean']:.2f} {units[param]} in the {name} (σ {s['std']:.2f}, n={s['count']})"
+                if s else f"no data in the {name}"
+                for name, s in stats.items()
+            ]
+            sentences.append(f"Mean {names[param]} {level_text}{period}: {'; '.join(parts)}.")
+            visualizations[names[param]] = {
+                "type": "bar",
+                "data": {
+                    "labels": list(stats),
+                    "datasets": [{
+                        "label": f"Mean {names[param].capitalize()} ({units[param]})",
+                        "data": [round(s['mean'], 3) if s else None for s in stats.values()],
+                        "backgroundColor": "rgba(255, 159, 64, 0.6)"
+                    }]
+                }
+            }
+        
         return {
-            "response": "I can help you compare ARGO float data. Please specify what you'd like to compare (e.g., 'Compare temperature between Arabian Sea and Bay of Bengal in 2024').",
+            "response": " ".join(sentences),
             "map_data": None,
-            "visualizations": None
+            "visualizations": visualizations
         }
 
     def _process_listing_query(self):
         """Process listing queries"""
-        from models import ArgoFloat
+        from utils.summary import catalog_overview
         
-        floats = self.db.query(ArgoFloat).all()
-        float_count = len(floats)
+        with stage("query_db"):
+            overview = catalog_overview(self.db)
+        float_count = overview["total"]
         
         if float_count == 0:
             response = "I don't have any ARGO float data yet. Please upload some NetCDF files first."
         else:
             response = f"I have data from {float_count} ARGO floats. "
             
-            # Get unique years
-            years = set()
-            for f in floats:
-                if f.juld:
-                    years.add(f.juld.year)
-            
-            if years:
-                years_list = sorted(list(years))
+            if overview["years"]:
+                years_list = sorted(overview["years"])
                 response += f"Data is available for the years: {', '.join(map(str, years_list))}. "
             
+            if overview["parameters"]:
+                params = sorted(overview["parameters"].items(), key=lambda item: -item[1])
+                response += f"Parameters measured: {', '.join(f'{name} ({count})' for name, count in params)}. "
+            
             response += "What specific information would you like to know?"
         
         return {
@@ -210,37 +214,17 @@ class ArgoQueryProcessor:
         }
 
     def _generate_map_data(self, floats):
-        """Generate map data for the response"""
-        markers = []
-        
-        for f in floats:
-            if f.latitude and f.longitude:
-                marker = {
-                    "position": [f.latitude, f.longitude],
-                    "popup": f"Float {f.platform_number}",
-                    "data": {
-                        "platform_number": f.platform_number,
-                        "date": f.juld.isoformat() if f.juld else "Unknown",
-                        "parameters": f.parameters
-                    }
-                }
-                markers.append(marker)
-        
-        if markers:
-            # Calculate center point
-            lats = [m["position"][0] for m in markers]
-            lons = [m["position"][1] for m in markers]
-            
-            center_lat = sum(lats) / len(lats)
-            center_lon = sum(lons) / len(lons)
-            
-            return {
-                "center": [center_lat, center_lon],
-                "zoom": 4,
-                "markers": markers
-            }
-        
-        return None
+        """Generate clustered map data for the response"""
+        from utils.clustering import clustered_map_data, float_marker
+        
+        located = [f for f in floats if f.latitude and f.longitude]
+        return clustered_map_data(
+            [f.latitude for f in located], [f.longitude for f in located],
+            lambda indices: [
+                float_marker(f.platform_number, f.juld, f.parameters, f.id)
+                for f in (located[i] for i in indices)
+            ]
+        )
 
     def _prepare_visualizations(self, floats, parameters, depth):
         """Prepare visualization data"""
@@ -261,14 +245,16 @@ class ArgoQueryProcessor:
 
     def _prepare_temperature_viz(self, floats, depth):
         """Prepare temperature visualization"""
-        # Simplified visualization data
+        from utils.profile_math import to_chart_values, values_at_depth
+        
+        level = f"{depth} m" if depth is not None else "Surface"
         return {
             "type": "scatter",
             "data": {
                 "labels": [f.platform_number for f in floats],
                 "datasets": [{
-                    "label": "Surface Temperature (°C)",
-                    "data": [20 + (i % 5) for i in range(len(floats))],  # Mock data
+                    "label": f"{level} Temperature (°C)",
+                    "data": to_chart_values(values_at_depth(floats, 'TEMP', depth)),
                     "backgroundColor": "rgba(255, 99, 132, 0.6)"
                 }]
             },
@@ -279,14 +265,16 @@ class ArgoQueryProcessor:
 
     def _prepare_salinity_viz(self, floats, depth):
         """Prepare salinity visualization"""
-        # Similar to temperature but with different mock data
+        from utils.profile_math import to_chart_values, values_at_depth
+        
+        level = f"{depth} m" if depth is not None else "Surface"
         return {
             "type": "bar",
             "data": {
                 "labels": [f.platform_number for f in floats],
                 "datasets": [{
-                    "label": "Salinity (PSU)",
-                    "data": [35.0 + (i * 0.1) for i in range(len(floats))],  # Mock data
+                    "label": f"{level} Salinity (PSU)",
+                    "data": to_chart_values(values_at_depth(floats, 'PSAL', depth)),
                     "backgroundColor": "rgba(54, 162, 235, 0.6)"
                 }]
             }
@@ -294,13 +282,16 @@ class ArgoQueryProcessor:
 
     def _prepare_pressure_viz(self, floats, depth):
         """Prepare pressure visualization"""
+        from utils.profile_math import deepest_pressure, interpolant_cache, to_chart_values
+        
+        P, _ = interpolant_cache.stack(floats, 'PRES')
         return {
             "type": "line",
             "data": {
                 "labels": [f"Float {f.platform_number}" for f in floats],
                 "datasets": [{
-                    "label": "Pressure (dbar)",
-                    "data": [500 + (i * 100) for i in range(len(floats))],  # Mock data
+                    "label": "Deepest Pressure (dbar)",
+                    "data": to_chart_values(deepest_pressure(P), 1),
                     "borderColor": "rgba(75, 192, 192, 1)",
                     "fill": False
                 }]
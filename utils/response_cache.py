@@ -0,0 +1,103 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable
+
+RESPONSE_CACHE_SIZE = int(os.getenv("OCEAN_RESPONSE_CACHE_SIZE", "256"))
+RESPONSE_CACHE_TTL = float(os.getenv("OCEAN_RESPONSE_CACHE_TTL", "300"))
+
+
+def intent_key(intent: Dict[str, Any]) -> Hashable:
+    """Normalize a parsed intent into a hashable cache key.
+
+    Questions that parse to the same slots share an entry regardless of
+    wording, casing or word order.
+    """
+    date_info = intent.get('date_info') or {}
+    date_range = date_info.get('range')
+    return (
+        intent.get('kind'),
+        date_info.get('year'),
+        date_info.get('month'),
+        (date_range['start'], date_range['end']) if date_range else None,
+        tuple(sorted(intent.get('parameters') or ())),
+        tuple(intent.get('regions') or ()),
+        intent.get('depth')
+    )
+
+
+class ResponseCache:
+    """Bounded LRU cache with a TTL, invalidated wholesale by data changes.
+
+    Entries are stored under the data version current when they were
+    computed; bump_data_version() (called on every upload and delete)
+    makes all of them unreachable, so answers never outlive the data
+    they were built from. Cached responses are shared between callers
+    and must be treated as read-only.
+    """
+
+    def __init__(self, maxsize: int = RESPONSE_CACHE_SIZE, ttl: float = RESPONSE_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.data_version = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        with self._lock:
+            version = self.data_version
+            entry = self._entries.get((version, key))
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end((version, key))
+                    self.hits += 1
+                    return value
+                del self._entries[(version, key)]
+                self.expirations += 1
+            self.misses += 1
+
+        value = compute()
+
+        with self._lock:
+            # Drop the result if the data changed while it was being computed
+            if version == self.data_version:
+                self._entries[(version, key)] = (time.monotonic() + self.ttl, value)
+                self._entries.move_to_end((version, key))
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        return value
+
+    def bump_data_version(self):
+        with self._lock:
+            self.data_version += 1
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl,
+                "data_version": self.data_version,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations
+            }
+
+
+response_cache = ResponseCache()
+
+
+def bump_data_version():
+    """Invalidate cached query responses after the float data changed"""
+    response_cache.bump_data_version()
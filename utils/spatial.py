@@ -0,0 +1,144 @@
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+import shapely
+from shapely.geometry import Polygon
+from sqlalchemy import and_, column, func, or_, select, table
+
+from models import ArgoFloat
+
+# SQLite R*Tree kept in sync with argo_floats by triggers (see migrations.py)
+RTREE_TABLE = "argo_floats_rtree"
+argo_floats_rtree = table(
+    RTREE_TABLE,
+    column("id"), column("min_lon"), column("max_lon"), column("min_lat"), column("max_lat")
+)
+
+# Approximate outlines of the named basins as (lon, lat) vertices
+REGIONS = {
+    'Arabian Sea': [
+        (51.0, 12.0), (57.0, 25.5), (67.0, 25.5), (73.0, 20.0), (77.5, 8.0),
+        (73.0, 0.0), (51.0, 0.0)
+    ],
+    'Bay of Bengal': [
+        (79.5, 6.0), (80.5, 16.0), (87.0, 22.5), (92.5, 22.5), (94.5, 16.0),
+        (98.5, 8.0), (93.0, 5.0)
+    ],
+    'Indian Ocean': [
+        (20.0, -60.0), (20.0, -35.0), (40.0, -10.0), (43.0, 12.0), (51.0, 30.0),
+        (60.0, 30.0), (78.0, 25.0), (92.0, 24.0), (100.0, 15.0), (105.0, -6.0),
+        (115.0, -10.0), (130.0, -12.0), (147.0, -45.0), (147.0, -60.0)
+    ]
+}
+
+BBox = Tuple[float, float, float, float]
+
+
+def parse_bbox(value: str) -> BBox:
+    """Parse "min_lon,min_lat,max_lon,max_lat" into a bounding box"""
+    parts = value.split(",")
+    if len(parts) != 4:
+        raise ValueError("bbox must be min_lon,min_lat,max_lon,max_lat")
+    min_lon, min_lat, max_lon, max_lat = (float(p) for p in parts)
+    if not (-90 <= min_lat <= max_lat <= 90):
+        raise ValueError("bbox latitudes must satisfy -90 <= min_lat <= max_lat <= 90")
+    if not (-180 <= min_lon <= 180 and -180 <= max_lon <= 180):
+        raise ValueError("bbox longitudes must be within [-180, 180]")
+    return min_lon, min_lat, max_lon, max_lat
+
+
+def parse_polygon(value: str) -> List[Tuple[float, float]]:
+    """Parse "lon lat,lon lat,..." into a list of polygon vertices"""
+    vertices = []
+    for point in value.split(","):
+        coords = point.split()
+        if len(coords) != 2:
+            raise ValueError("polygon must be a list of 'lon lat' pairs separated by commas")
+        vertices.append((float(coords[0]), float(coords[1])))
+    if len(vertices) < 3:
+        raise ValueError("polygon needs at least 3 vertices")
+    return vertices
+
+
+def polygon_bounds(vertices: List[Tuple[float, float]]) -> BBox:
+    lons = [lon for lon, _ in vertices]
+    lats = [lat for _, lat in vertices]
+    return min(lons), min(lats), max(lons), max(lats)
+
+
+def _is_sqlite(db) -> bool:
+    return db.get_bind().dialect.name == "sqlite"
+
+
+def _lon_ranges(min_lon: float, max_lon: float):
+    # A box whose west edge is east of its east edge crosses the antimeridian
+    if min_lon <= max_lon:
+        return [(min_lon, max_lon)]
+    return [(min_lon, 180.0), (-180.0, max_lon)]
+
+
+def bbox_condition(db, bbox: BBox):
+    """SQL condition selecting floats inside a bounding box.
+
+    On SQLite the candidate ids come from the R*Tree; the exact column
+    comparison is kept because the R*Tree stores float32 bounds.
+    """
+    min_lon, min_lat, max_lon, max_lat = bbox
+    conditions = []
+    for west, east in _lon_ranges(min_lon, max_lon):
+        exact = and_(
+            ArgoFloat.longitude >= west, ArgoFloat.longitude <= east,
+            ArgoFloat.latitude >= min_lat, ArgoFloat.latitude <= max_lat
+        )
+        if _is_sqlite(db):
+            candidates = select(argo_floats_rtree.c.id).where(
+                argo_floats_rtree.c.max_lon >= west, argo_floats_rtree.c.min_lon <= east,
+                argo_floats_rtree.c.max_lat >= min_lat, argo_floats_rtree.c.min_lat <= max_lat
+            )
+            exact = and_(ArgoFloat.id.in_(candidates), exact)
+        conditions.append(exact)
+    return or_(*conditions)
+
+
+def polygon_condition(db, vertices: List[Tuple[float, float]]):
+    """SQL condition selecting floats inside a polygon.
+
+    The polygon's bounding box is resolved through the spatial index and
+    only those candidates are tested with point_in_polygon(). Databases
+    without that function fall back to the bounding box alone.
+    """
+    condition = bbox_condition(db, polygon_bounds(vertices))
+    if _is_sqlite(db):
+        condition = and_(
+            condition,
+            func.point_in_polygon(ArgoFloat.longitude, ArgoFloat.latitude, polygon_text(vertices)) == 1
+        )
+    return condition
+
+
+def region_condition(db, region: str):
+    """SQL condition for one of the named REGIONS"""
+    return polygon_condition(db, REGIONS[region])
+
+
+def polygon_text(vertices: List[Tuple[float, float]]) -> str:
+    return ",".join(f"{lon} {lat}" for lon, lat in vertices)
+
+
+@lru_cache(maxsize=128)
+def _prepared_polygon(text: str) -> Polygon:
+    polygon = Polygon(parse_polygon(text))
+    shapely.prepare(polygon)
+    return polygon
+
+
+def point_in_polygon(lon: Optional[float], lat: Optional[float], text: str) -> int:
+    """SQLite function: 1 when (lon, lat) lies inside the polygon text"""
+    if lon is None or lat is None:
+        return 0
+    return int(shapely.intersects_xy(_prepared_polygon(text), lon, lat))
+
+
+def register_sqlite_functions(dbapi_connection):
+    """Install the spatial helper functions on a raw SQLite connection"""
+    dbapi_connection.create_function("point_in_polygon", 3, point_in_polygon, deterministic=True)
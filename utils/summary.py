@@ -0,0 +1,85 @@
+from typing import Dict, Any
+
+from sqlalchemy import func, select
+
+from models import ArgoFloat, FloatSummary
+
+# Year/month of a profile as stored in float_summary; 0 stands for unknown
+YEAR_SQL = "COALESCE(CAST(strftime('%Y', {row}.juld) AS INTEGER), 0)"
+MONTH_SQL = "COALESCE(CAST(strftime('%m', {row}.juld) AS INTEGER), 0)"
+
+
+def _add_statements(row: str, delta: int):
+    # Only string entries count; json_each yields a NULL value for a JSON null
+    year, month = YEAR_SQL.format(row=row), MONTH_SQL.format(row=row)
+    upsert = f"ON CONFLICT(year, month, parameter) DO UPDATE SET float_count = float_count + {delta}"
+    return f"""
+        INSERT INTO float_summary (year, month, parameter, float_count)
+        VALUES ({year}, {month}, '', {delta}) {upsert};
+        INSERT INTO float_summary (year, month, parameter, float_count)
+        SELECT DISTINCT {year}, {month}, value, {delta} FROM json_each({row}.parameters) WHERE type = 'text' {upsert};
+    """
+
+
+def _remove_statements(row: str):
+    return _add_statements(row, -1) + """
+        DELETE FROM float_summary WHERE float_count <= 0;
+    """
+
+
+# SQLite triggers keeping float_summary in step with argo_floats
+SUMMARY_TRIGGERS = {
+    "float_summary_insert": f"""
+        CREATE TRIGGER float_summary_insert AFTER INSERT ON argo_floats
+        BEGIN {_add_statements('NEW', 1)} END
+    """,
+    "float_summary_update": f"""
+        CREATE TRIGGER float_summary_update AFTER UPDATE OF juld, parameters ON argo_floats
+        BEGIN {_remove_statements('OLD')} {_add_statements('NEW', 1)} END
+    """,
+    "float_summary_delete": f"""
+        CREATE TRIGGER float_summary_delete AFTER DELETE ON argo_floats
+        BEGIN {_remove_statements('OLD')} END
+    """
+}
+
+REBUILD_SUMMARY_SQL = f"""
+    INSERT INTO float_summary (year, month, parameter, float_count)
+    SELECT {YEAR_SQL.format(row='argo_floats')}, {MONTH_SQL.format(row='argo_floats')}, '', COUNT(*)
+    FROM argo_floats GROUP BY 1, 2
+    UNION ALL
+    SELECT {YEAR_SQL.format(row='argo_floats')}, {MONTH_SQL.format(row='argo_floats')}, p.value, COUNT(DISTINCT argo_floats.id)
+    FROM argo_floats, json_each(argo_floats.parameters) AS p WHERE p.type = 'text' GROUP BY 1, 2, 3
+"""
+
+
+def catalog_overview(db) -> Dict[str, Any]:
+    """Profile totals by year, month and parameter.
+
+    Reads the trigger-maintained float_summary table on SQLite, so the cost
+    depends on the number of months rather than profiles. Other databases
+    fall back to GROUP BY aggregates over argo_floats.
+    """
+    if db.get_bind().dialect.name == "sqlite":
+        rows = db.execute(select(
+            FloatSummary.year, FloatSummary.month, FloatSummary.parameter, FloatSummary.float_count
+        )).all()
+    else:
+        year = func.coalesce(func.extract('year', ArgoFloat.juld), 0)
+        month = func.coalesce(func.extract('month', ArgoFloat.juld), 0)
+        rows = [(y, m, '', n) for y, m, n in db.execute(
+            select(year, month, func.count(ArgoFloat.id)).group_by(year, month)
+        ).all()]
+
+    overview = {"total": 0, "years": {}, "months": {}, "parameters": {}}
+    for year, month, parameter, count in rows:
+        year, month = int(year), int(month)
+        if parameter:
+            overview["parameters"][parameter] = overview["parameters"].get(parameter, 0) + count
+            continue
+        overview["total"] += count
+        if year:
+            overview["years"][year] = overview["years"].get(year, 0) + count
+            key = f"{year:04d}-{month:02d}"
+            overview["months"][key] = overview["months"].get(key, 0) + count
+    return overview
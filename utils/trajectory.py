@@ -0,0 +1,92 @@
+from datetime import datetime
+from itertools import groupby
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from models import ArgoFloat
+from utils.float_query import apply_time_range
+
+# Positions are served from ix_argo_floats_platform_juld, a covering index
+# on (platform_number, juld, latitude, longitude, cycle_number) that is
+# filled as profiles are ingested, so no NetCDF file is read per request.
+
+
+def _position_query(db):
+    return db.query(
+        ArgoFloat.platform_number, ArgoFloat.cycle_number, ArgoFloat.juld,
+        ArgoFloat.latitude, ArgoFloat.longitude
+    ).filter(ArgoFloat.latitude.isnot(None), ArgoFloat.longitude.isnot(None))
+
+
+def platform_positions(db, platform_number: str, start: Optional[datetime] = None,
+                       end: Optional[datetime] = None):
+    """Time-ordered positions of one platform, optionally within [start, end)"""
+    query = _position_query(db).filter(ArgoFloat.platform_number == platform_number)
+    query = apply_time_range(query, start, end)
+    return query.order_by(ArgoFloat.juld, ArgoFloat.cycle_number).all()
+
+
+def window_positions(db, start: Optional[datetime], end: Optional[datetime], bbox_condition=None):
+    """Positions of every platform within [start, end), grouped by platform"""
+    query = apply_time_range(_position_query(db), start, end)
+    if bbox_condition is not None:
+        query = query.filter(bbox_condition)
+    rows = query.order_by(ArgoFloat.platform_number, ArgoFloat.juld, ArgoFloat.cycle_number).all()
+    return {platform: list(group) for platform, group in groupby(rows, key=lambda row: row.platform_number)}
+
+
+def simplify_indices(lats: np.ndarray, lons: np.ndarray, tolerance: float) -> np.ndarray:
+    """Indices kept by Douglas-Peucker simplification of a track.
+
+    tolerance is in degrees; the first and last positions are always kept.
+    """
+    n = len(lats)
+    if n < 3 or tolerance <= 0:
+        return np.arange(n)
+
+    points = np.column_stack([lons, lats])
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        segment = points[last] - points[first]
+        offsets = points[first + 1:last] - points[first]
+        length = np.hypot(*segment)
+        if length == 0:
+            distances = np.hypot(offsets[:, 0], offsets[:, 1])
+        else:
+            distances = np.abs(segment[0] * offsets[:, 1] - segment[1] * offsets[:, 0]) / length
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance:
+            split = first + 1 + farthest
+            keep[split] = True
+            stack.append((first, split))
+            stack.append((split, last))
+    return np.flatnonzero(keep)
+
+
+def build_trajectory(platform_number: str, rows, tolerance: float = 0.0) -> Dict[str, Any]:
+    """Trajectory payload for the dashboard; path is [[lat, lon], ...]"""
+    lats = np.array([row.latitude for row in rows], dtype=float)
+    lons = np.array([row.longitude for row in rows], dtype=float)
+    kept = simplify_indices(lats, lons, tolerance)
+
+    points: List[Dict[str, Any]] = []
+    for i in kept:
+        row = rows[i]
+        points.append({
+            "cycle_number": row.cycle_number,
+            "juld": row.juld.isoformat() if row.juld else None,
+            "latitude": row.latitude,
+            "longitude": row.longitude
+        })
+    return {
+        "platform_number": platform_number,
+        "total_points": len(rows),
+        "points": points,
+        "path": [[p["latitude"], p["longitude"]] for p in points]
+    }